@@ -23,12 +23,27 @@ from typing import (
 import argparse
 import sys
 import os
-import re
-import pathlib
-from urllib.parse import urlparse, ParseResult, urlunparse, unquote as url_unquote
 import subprocess
 import venv
 import tempfile
+from functools import lru_cache
+
+@lru_cache(maxsize=512)
+def _normpath_abs(pathname: str) -> str:
+  return os.path.normpath(pathname)
+
+def _norm_dir(dirname: str) -> str:
+  # Same as os.path.abspath(os.path.normpath(os.path.expanduser(dirname))). Only the
+  # normalization of absolute names is cached, since it does not depend on cwd or HOME.
+  if dirname.startswith('~'):
+    dirname = os.path.expanduser(dirname)
+  if (os.sep == '/' and dirname.startswith('/') and not '//' in dirname and not '/.' in dirname
+      and not dirname.endswith('/')):
+    # Already absolute and normalized
+    return dirname
+  if os.path.isabs(dirname):
+    return _normpath_abs(dirname)
+  return os.path.abspath(dirname)
 
 def searchpath_split(searchpath: Optional[str]=None) -> List[str]:
   if searchpath is None:
@@ -43,14 +58,14 @@ def searchpath_normalize(searchpath: Optional[str]=None) -> str:
   return searchpath_join(searchpath_split(searchpath))
 
 def searchpath_parts_contains_dir(parts: List[str], dirname: str) -> bool:
-  dirname = os.path.abspath(os.path.normpath(os.path.expanduser(dirname)))
+  dirname = _norm_dir(dirname)
   return dirname in parts
 
 def searchpath_contains_dir(searchpath: Optional[str], dirname: str) -> bool:
   return searchpath_parts_contains_dir(searchpath_split(searchpath), dirname)
 
 def searchpath_parts_remove_dir(parts: List[str], dirname: str) -> List[str]:
-  dirname = os.path.abspath(os.path.normpath(os.path.expanduser(dirname)))
+  dirname = _norm_dir(dirname)
   result = [ x for x in parts if x != dirname ]
   return result
 
@@ -58,15 +73,16 @@ def searchpath_remove_dir(searchpath: Optional[str], dirname: str) -> str:
   return searchpath_join(searchpath_parts_remove_dir(searchpath_split(searchpath), dirname))
 
 def searchpath_parts_prepend(parts: List[str], dirname: str) -> List[str]:
-  dirname = os.path.abspath(os.path.normpath(os.path.expanduser(dirname)))
-  result = [dirname] + searchpath_parts_remove_dir(parts, dirname)
+  dirname = _norm_dir(dirname)
+  result = [dirname]
+  result.extend(x for x in parts if x != dirname)
   return result
 
 def searchpath_prepend(searchpath: Optional[str], dirname: str) -> str:
   return searchpath_join(searchpath_parts_prepend(searchpath_split(searchpath), dirname))
 
 def searchpath_parts_prepend_if_missing(parts: List[str], dirname: str) -> List[str]:
-  dirname = os.path.abspath(os.path.normpath(os.path.expanduser(dirname)))
+  dirname = _norm_dir(dirname)
   if dirname in parts:
     result = parts[:]
   else:
@@ -77,15 +93,16 @@ def searchpath_prepend_if_missing(searchpath: Optional[str], dirname: str) -> st
   return searchpath_join(searchpath_parts_prepend_if_missing(searchpath_split(searchpath), dirname))
 
 def searchpath_parts_force_append(parts: List[str], dirname: str) -> List[str]:
-  dirname = os.path.abspath(os.path.normpath(os.path.expanduser(dirname)))
-  result = searchpath_parts_remove_dir(parts, dirname) + [dirname]
+  dirname = _norm_dir(dirname)
+  result = [ x for x in parts if x != dirname ]
+  result.append(dirname)
   return result
 
 def searchpath_force_append(searchpath: Optional[str], dirname: str) -> str:
   return searchpath_join(searchpath_parts_force_append(searchpath_split(searchpath), dirname))
 
 def searchpath_parts_append(parts: List[str], dirname: str) -> List[str]:
-  dirname = os.path.abspath(os.path.normpath(os.path.expanduser(dirname)))
+  dirname = _norm_dir(dirname)
   if dirname in parts:
     result = parts[:]
   else:
@@ -98,23 +115,30 @@ def searchpath_append(searchpath: Optional[str], dirname: str) -> str:
 def deactivate_virtualenv(env: Optional[MutableMapping]=None):
   if env is None:
     env = os.environ
-  if 'VIRTUAL_ENV' in env:
-    venv = env['VIRTUAL_ENV']
-    del env['VIRTUAL_ENV']
-    if 'POETRY_ACTIVE' in env:
-      del env['POETRY_ACTIVE']
-    if 'PATH' in env:
-      venv_bin = os.path.join(venv, 'bin')
-      env['PATH'] = searchpath_remove_dir(env['PATH'], venv_bin)
+  venv = env.pop('VIRTUAL_ENV', None)
+  if venv is None:
+    return
+  env.pop('POETRY_ACTIVE', None)
+  path = env.get('PATH')
+  if not path is None:
+    venv_bin = os.path.join(venv, 'bin')
+    env['PATH'] = searchpath_remove_dir(path, venv_bin)
 
 def activate_virtualenv(venv_dir: str, env: Optional[MutableMapping]=None):
-  venv_dir = os.path.abspath(os.path.normpath(os.path.expanduser(venv_dir)))
+  venv_dir = _norm_dir(venv_dir)
   venv_bin_dir = os.path.join(venv_dir, 'bin')
   if env is None:
     env = os.environ
-  deactivate_virtualenv(env)
+  # Equivalent to deactivate_virtualenv() followed by searchpath_prepend_if_missing(), but
+  # PATH is only split and joined once
+  old_venv_dir = env.pop('VIRTUAL_ENV', None)
+  if not old_venv_dir is None:
+    env.pop('POETRY_ACTIVE', None)
   env['VIRTUAL_ENV'] = venv_dir
-  env['PATH'] = searchpath_prepend_if_missing(env['PATH'], venv_bin_dir)
+  parts = searchpath_split(env['PATH'])
+  if not old_venv_dir is None:
+    parts = searchpath_parts_remove_dir(parts, os.path.join(old_venv_dir, 'bin'))
+  env['PATH'] = searchpath_join(searchpath_parts_prepend_if_missing(parts, venv_bin_dir))
 
 class CmdExitError(RuntimeError):
   exit_code: int
@@ -210,9 +234,9 @@ class Cli:
     if '[' in package_name:
       package_name = package_name.split('[', 1)[0]
     if package_name.endswith('.tar.gz'):
-      package_name = package_name[:-7]
+      package_name = package_name[:-len('.tar.gz')]
     if package_name.endswith('.git'):
-      package_name = package_name[:-7]
+      package_name = package_name[:-len('.git')]
     if '/' in package_name:
       package_name = package_name.rsplit('/', 1)[1]
     if package_name == '' or '.' in package_name or '#' in package_name:
@@ -246,12 +270,14 @@ class Cli:
       if not os.path.isdir(app_dir):
         os.makedirs(app_dir)
 
-      builder = venv.EnvBuilder(
-          clear=clean,
-        )
-      builder.create(app_venv_dir)
-      
       python = self.python_prog
+      # Rebuilding an existing venv is slow; only do it when asked to, or when it is missing
+      if clean or update or not os.path.exists(python):
+        builder = venv.EnvBuilder(
+            clear=clean,
+          )
+        builder.create(app_venv_dir)
+
       pip = self.pip_prog
       no_venv_env = self.no_venv_env
 
@@ -15,8 +15,10 @@ from .internal_types import Jsonable, JsonableDict, JsonableList
 from .exceptions import ProjectInitError, CalledProcessErrorWithStderrMessage
 from .util import (
     run_once,
+    abspath_expanduser,
     get_tmp_dir,
     hash_pathname,
+    hash_pathnames,
     full_name_of_type,
     full_type,
     clone_json_data,
@@ -25,6 +27,7 @@ from .util import (
     get_git_config_value,
     get_optional_git_config_value,
     get_git_root_dir,
+    clear_git_cache,
     get_git_user_email,
     get_git_user_friendly_name,
     set_git_config_value,
@@ -42,21 +45,21 @@ from .util import (
     dedent,
     check_version_ge,
     chown_root, command_exists,
-    download_url_file, file_contents, files_are_identical,
+    download_url_file, file_contents, files_are_identical, get_default_pool_manager,
     find_command_in_path, get_all_os_groups,
     get_current_architecture, get_current_system, get_current_os_user,
     get_file_hash_hex, get_gid_of_group, get_linux_distro_name,
     get_os_groups_of_current_process, get_os_groups_of_user,
-    os_group_exists, get_group_of_gid, gid_exists,
+    os_group_exists, get_group_of_gid, gid_exists, clear_os_group_cache,
     os_group_includes_current_process, os_group_includes_user,
-    running_as_root, searchpath_append,
+    running_as_root, searchpath_append, searchpath_append_many,
     searchpath_contains_dir, searchpath_force_append,
     searchpath_join, searchpath_normalize,
-    searchpath_parts_append, searchpath_parts_contains_dir,
+    searchpath_parts_append, searchpath_parts_append_many, searchpath_parts_contains_dir,
     searchpath_parts_force_append, searchpath_parts_prepend,
-    searchpath_parts_prepend_if_missing,
+    searchpath_parts_prepend_if_missing, searchpath_parts_prepend_many_if_missing,
     searchpath_parts_remove_dir, searchpath_prepend,
-    searchpath_prepend_if_missing, searchpath_remove_dir,
+    searchpath_prepend_if_missing, searchpath_prepend_many_if_missing, searchpath_remove_dir,
     searchpath_split, should_run_with_group, sudo_call,
     sudo_check_call, sudo_check_output,
     sudo_check_output_stderr_exception, sudo_Popen, unix_mv,
@@ -65,8 +68,10 @@ from .util import (
 from .pyproject_toml import PyprojectToml
 from .os_packages import (
     PackageList, create_os_group, get_dpkg_arch, get_os_package_version,
+    get_installed_os_package_versions,
     install_apt_sources_list_if_missing,
     install_gpg_keyring_if_missing, install_os_packages,
+    invalidate_os_package_cache,
     invalidate_os_package_list, os_group_add_user,
     os_package_is_installed, uninstall_os_packages,
     update_and_install_os_packages,
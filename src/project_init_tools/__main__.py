@@ -8,10 +8,11 @@
 """project-init-tools commandline tool"""
 
 from types import ModuleType
-from typing import Optional, Sequence, Tuple, List, Union, Protocol, Dict
+from typing import Optional, Sequence, Tuple, List, Union, Protocol, Dict, cast
 
 import sys
 import argparse
+import importlib
 
 installer_list: List[Union[str, Tuple[str, str]]] = [
     'aws-cli',
@@ -36,7 +37,7 @@ class Installer:
   module_name: str
   func_name: str = 'main'
   # module: ModuleType
-  func: InstallerEntry
+  _func: Optional[InstallerEntry] = None
 
   def __init__(self, initializer: Union[str, Tuple[str, str]]):
     if isinstance(initializer, str):
@@ -46,13 +47,20 @@ class Installer:
       assert isinstance(initializer, tuple)
       self.name, short_module_name = initializer
     self.module_name = f'project_init_tools.installer.{short_module_name}.__main__'
-    imp_mod: InstallerEntry = __import__(self.module_name, fromlist=[self.func_name])
-    self.func = getattr(imp_mod, self.func_name)
+
+  @property
+  def func(self) -> InstallerEntry:
+    """The installer's entry point. The installer module is only imported when first needed."""
+    if self._func is None:
+      imp_mod = importlib.import_module(self.module_name)
+      self._func = cast(InstallerEntry, getattr(imp_mod, self.func_name))
+    return self._func
 
 installers: Dict[str, Installer] = {}
 for _initializer in installer_list:
   _installer = Installer(_initializer)
   installers[_installer.name] = _installer
+installer_choices: Tuple[str, ...] = tuple(sorted(installers.keys()))
 
 def cmd_bare(parser: argparse.ArgumentParser, args: argparse.Namespace) -> int:
   parser.print_help()
@@ -74,7 +82,7 @@ def main(argv: Optional[Sequence[str]]=None, prog: Optional[str]=None) -> int:
 
   subparsers = parser.add_subparsers(help='command help')
   parser_install = subparsers.add_parser('install', help='Install tools/packages')
-  parser_install.add_argument('package', help='Virtual package to install', choices=sorted(installers.keys()))
+  parser_install.add_argument('package', help='Virtual package to install', choices=installer_choices)
   parser_install.add_argument('installer_args', nargs=argparse.REMAINDER, help='Installer arguments')
   parser_install.set_defaults(func=cmd_install)
 
@@ -6,12 +6,15 @@
 
 """Simple utilities for interActing with github"""
 
-from typing import cast
+from typing import cast, Optional
 
 import urllib.request
+from urllib.parse import unquote as url_unquote
 import json
+from functools import lru_cache
 from .internal_types import JsonableDict
 from .exceptions import ProjectInitError
+from .util import get_default_pool_manager
 
 def get_github_project_latest_release_info(gh_repo_short_name: str) -> JsonableDict:
   url = f"https://api.github.com/repos/{gh_repo_short_name}/releases/latest"
@@ -22,7 +25,41 @@ def get_github_project_latest_release_info(gh_repo_short_name: str) -> JsonableD
     raise ProjectInitError(f"Malformed github release info document: {url}")
   return result
 
+def _get_github_project_latest_release_tag_from_redirect(gh_repo_short_name: str) -> Optional[str]:
+  """Reads the latest release tag from the redirect target of the project's "releases/latest" page.
+
+  This avoids the GitHub REST API, which is rate-limited for unauthenticated clients and
+  returns a much larger document. Returns None if the redirect is not of the expected form.
+  """
+  url = f"https://github.com/{gh_repo_short_name}/releases/latest"
+  resp = get_default_pool_manager().request('HEAD', url, redirect=False)
+  location = resp.headers.get('Location')
+  if not resp.status in (301, 302, 303, 307, 308) or location is None:
+    return None
+  marker = '/releases/tag/'
+  i = location.find(marker)
+  if i < 0:
+    return None
+  tag = url_unquote(location[i + len(marker):].split('?', 1)[0].split('#', 1)[0])
+  if tag == '' or '/' in tag:
+    return None
+  return tag
+
+@lru_cache(maxsize=32)
 def get_github_project_latest_release_tag(gh_repo_short_name: str) -> str:
+  """Returns the tag of the latest release of a github project; e.g., "v2.20.2".
+
+  The result is cached per project for the life of the process, so installers that
+  share a project do not repeat the lookup.
+  """
+  result: Optional[str] = None
+  try:
+    result = _get_github_project_latest_release_tag_from_redirect(gh_repo_short_name)
+  except Exception:
+    # Fall back to the REST API below
+    pass
+  if not result is None:
+    return result
   info = get_github_project_latest_release_info(gh_repo_short_name)
   result = cast(str, info['tag_name'])
   if not isinstance(result, str):
@@ -14,18 +14,21 @@ from pathlib import Path
 import subprocess
 import sys
 import os
+import stat
 import argparse
 import re
-import urllib.request
 from urllib.parse import urlparse
 import http.client
 import platform
 import tempfile
 import shutil
 import shlex
+import hashlib
 import types
 from enum import Enum
 from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
 from ...exceptions import ProjectInitError
 
@@ -33,12 +36,13 @@ from ...util import (
     command_exists,
     find_command_in_path,
     download_url_text,
+    get_default_pool_manager,
     run_once,
     sudo_check_output_stderr_exception,
     check_version_ge,
     get_current_architecture,
     get_current_system,
-    atomic_mv,
+    abspath_expanduser,
     find_command_in_path,
 )
 
@@ -49,38 +53,72 @@ MIN_DOCKER_COMPOSE_VERSION = "2.20.2"
 verbose: bool = False
 
 home_dir = os.path.expanduser("~")
-default_docker_compose_bin_dir = os.path.join(home_dir, '.local', 'bin')
-default_docker_plugin_dir = os.path.join(home_dir, '.docker', 'cli-plugins')
+default_docker_compose_bin_dir = os.path.abspath(os.path.join(home_dir, '.local', 'bin'))
+default_docker_plugin_dir = os.path.abspath(os.path.join(home_dir, '.docker', 'cli-plugins'))
 default_docker_compose_cmd = os.path.join(default_docker_compose_bin_dir, 'docker-compose')
 
+def _strip_v(version: str) -> str:
+  """Removes a leading 'v' from a version string or release tag"""
+  return version[1:] if version[:1] == 'v' else version
+
 @run_once
 def get_docker_compose_latest_version() -> str:
   """
   Returns the latest version of docker-compose CLI available for download
   """
-  result = get_github_project_latest_release_tag('docker/compose')
-  if result.startswith('v'):
-    result = result[1:]
-  return result
+  return _strip_v(get_github_project_latest_release_tag('docker/compose'))
+
+def _get_docker_compose_expected_sha256(url: str) -> Optional[str]:
+  """Returns the published SHA256 hex digest of a docker-compose release binary, or None
+     if the release does not publish one."""
+  resp = get_default_pool_manager().request('GET', url)
+  if resp.status != 200:
+    return None
+  # The checksum file is "<hex digest> *<filename>"
+  fields = resp.data.decode('utf-8').split()
+  if len(fields) == 0:
+    return None
+  return fields[0].lower()
 
 def download_docker_compose(dirname: str, version: Optional[str]=None, stderr: TextIO=sys.stderr) -> str:
   if version is None:
     version = get_docker_compose_latest_version()
-  version_tag = version
-  if not version_tag.startswith('v'):
-    version_tag = 'v' + version_tag
-  dirname = os.path.abspath(os.path.expanduser(dirname))
+  version_tag = 'v' + _strip_v(version)
+  dirname = abspath_expanduser(dirname)
   result: str = os.path.join(dirname, 'docker-compose')
-  temp_file = result + '.tmp'
   os_system = get_current_system()
   arch = get_current_architecture()
   url = f"https://github.com/docker/compose/releases/download/{version_tag}/docker-compose-{os_system}-{arch}"
 
-  if not os.path.isdir(dirname):
-    os.makedirs(dirname)
-  urllib.request.urlretrieve(url, temp_file)
-  os.chmod(temp_file, 0o755)
-  atomic_mv(temp_file, result)
+  os.makedirs(dirname, exist_ok=True)
+  pool_manager = get_default_pool_manager()
+  expected_sha256 = _get_docker_compose_expected_sha256(url + '.sha256')
+  # A uniquely named temp file in the same directory as result, so concurrent installs
+  # don't collide and the final rename is atomic. It is removed if anything fails.
+  fd, temp_file = tempfile.mkstemp(prefix='.docker-compose-', suffix='.tmp', dir=dirname)
+  try:
+    # Use the shared connection pool, and stream the binary to disk in large chunks,
+    # hashing each chunk as it is written so verification needs no second pass
+    h = hashlib.sha256()
+    with os.fdopen(fd, 'wb') as f:
+      resp = pool_manager.request('GET', url, preload_content=False)
+      try:
+        if resp.status != 200:
+          raise ProjectInitError(f"Download of docker-compose from {url} failed with HTTP status {resp.status}")
+        for chunk in iter(lambda: resp.read(1024 * 1024), b''):
+          f.write(chunk)
+          h.update(chunk)
+      finally:
+        resp.release_conn()
+    if not expected_sha256 is None and h.hexdigest() != expected_sha256:
+      raise ProjectInitError(
+          f"Downloaded docker-compose from {url} has SHA256 {h.hexdigest()}; expected {expected_sha256}"
+        )
+    os.chmod(temp_file, 0o755)
+    os.replace(temp_file, result)
+  except BaseException:
+    os.unlink(temp_file)
+    raise
   return result
 
 def get_docker_compose_prog(dirname: Optional[str]=None) -> Optional[str]:
@@ -103,16 +141,22 @@ def require_docker_compose_prog(dirname: Optional[str]=None) -> str:
 def docker_compose_is_installed(dirname: Optional[str]=None) -> bool:
   return not get_docker_compose_prog(dirname=dirname) is None
 
-def get_docker_compose_version(dirname: Optional[str]=None) -> str:
+@lru_cache(maxsize=8)
+def _get_docker_compose_prog_version(prog: str, stamp: Tuple[int, int, int]) -> str:
+  """Runs a docker-compose executable to get its version. The stamp (inode, size, mtime)
+     keys the cache, so a replaced executable is run again."""
   version = cast(bytes,
       sudo_check_output_stderr_exception(
-          [require_docker_compose_prog(dirname=dirname), 'version', '--short'],
+          [prog, 'version', '--short'],
           use_sudo=False
         )
     ).decode('utf-8').rstrip()
-  if version.startswith('v'):
-    version = version[1:]
-  return version
+  return _strip_v(version)
+
+def get_docker_compose_version(dirname: Optional[str]=None) -> str:
+  prog = require_docker_compose_prog(dirname=dirname)
+  st = os.stat(prog)
+  return _get_docker_compose_prog_version(prog, (st.st_ino, st.st_size, st.st_mtime_ns))
 
 def create_docker_compose_symlink(
       dirname: Optional[str]=None,
@@ -121,10 +165,10 @@ def create_docker_compose_symlink(
     ) -> str:
   if dirname is None:
     dirname = default_docker_compose_bin_dir
-  dirname = os.path.abspath(os.path.expanduser(dirname))
+  dirname = abspath_expanduser(dirname)
   if plugin_dirname is None:
     plugin_dirname = default_docker_plugin_dir
-  plugin_dirname = os.path.abspath(os.path.expanduser(plugin_dirname))
+  plugin_dirname = abspath_expanduser(plugin_dirname)
   if plugin_path is None:
     plugin_path = os.path.join(plugin_dirname, 'docker-compose')
   if not os.path.exists(plugin_path):
@@ -132,18 +176,22 @@ def create_docker_compose_symlink(
   symlink_path = os.path.join(dirname, 'docker-compose')
   if symlink_path == plugin_path:
     print(f"docker-compose plugin directly installed at {symlink_path}; no symlink needed", file=sys.stderr)
-  if os.path.exists(symlink_path):
-    if os.path.islink(symlink_path):
-      if os.readlink(symlink_path) == plugin_path:
-        print(f"docker-compose symlink already installed at {symlink_path} and points to {plugin_path}; no action needed", file=sys.stderr)
-        return symlink_path
-      print(f"docker-compose symlink installed at {symlink_path} points to wrong plugin path {plugin_path}; replacing", file=sys.stderr)
-      os.unlink(symlink_path)
-    else:
-      print(f"docker-compose symlink location {symlink_path} is not a symlink; replacing with symlink", file=sys.stderr)
-      os.unlink(symlink_path)
-  else:
+  # A single lstat tells us whether anything is there and whether it is a symlink
+  try:
+    st: Optional[os.stat_result] = os.lstat(symlink_path)
+  except FileNotFoundError:
+    st = None
+  if st is None:
     print(f"docker-compose symlink not installed at {symlink_path}; installing", file=sys.stderr)
+  elif stat.S_ISLNK(st.st_mode):
+    if os.readlink(symlink_path) == plugin_path:
+      print(f"docker-compose symlink already installed at {symlink_path} and points to {plugin_path}; no action needed", file=sys.stderr)
+      return symlink_path
+    print(f"docker-compose symlink installed at {symlink_path} points to wrong plugin path {plugin_path}; replacing", file=sys.stderr)
+    os.unlink(symlink_path)
+  else:
+    print(f"docker-compose symlink location {symlink_path} is not a symlink; replacing with symlink", file=sys.stderr)
+    os.unlink(symlink_path)
   os.symlink(plugin_path, symlink_path)
   return symlink_path
 
@@ -185,27 +233,36 @@ def install_docker_compose(
   """
   if dirname is None:
     dirname = default_docker_compose_bin_dir
-  dirname = os.path.abspath(os.path.expanduser(dirname))
+  dirname = abspath_expanduser(dirname)
   if plugin_dirname is None:
     plugin_dirname = default_docker_plugin_dir
-  plugin_dirname = os.path.abspath(os.path.expanduser(plugin_dirname))
+  plugin_dirname = abspath_expanduser(plugin_dirname)
   if upgrade_version == 'latest':
     upgrade_version = None
 
+  old_version: Optional[str] = None
+  old_prog = get_docker_compose_prog(dirname=dirname)
+
   if min_version == 'latest':
-    min_version = get_docker_compose_latest_version()
+    if old_prog is None or force:
+      min_version = get_docker_compose_latest_version()
+    else:
+      # Querying GitHub and running the installed binary are independent, so overlap them
+      with ThreadPoolExecutor(max_workers=1) as executor:
+        latest_version_future = executor.submit(get_docker_compose_latest_version)
+        old_version = get_docker_compose_version(dirname)
+        min_version = latest_version_future.result()
 
   if not upgrade_version is None and not min_version is None and not check_version_ge(upgrade_version, min_version):
     raise RuntimeError("Requested docker-compose upgrade version {upgrade_version} is less than than minimum required version {min_version}")
 
-  old_version: Optional[str] = None
-  if docker_compose_is_installed(dirname):
-    old_prog = get_docker_compose_prog(dirname=dirname)
-    assert not old_prog is None
-    old_version = get_docker_compose_version(dirname)
+  if not old_prog is None:
     if force:
-      print(f"Forcing upgrade/reinstall of docker-compose version {old_version} in {dirname}", file=sys.stderr)
+      # The installed version is irrelevant to a forced reinstall, so don't run the binary
+      print(f"Forcing upgrade/reinstall of docker-compose in {dirname}", file=sys.stderr)
     else:
+      if old_version is None:
+        old_version = get_docker_compose_version(dirname)
       if min_version is None:
         print(f"docker-compose version {old_version} is already installed in {dirname}; no need to reinstall", file=stderr)
         return old_prog, False
@@ -7,28 +7,162 @@
 
 """Utilities to assist with installation of OS packages"""
 
-import filecmp
 import grp
-import hashlib
+import json
 import os
 import platform
+import struct
 import subprocess
 import sys
-from typing import List, Optional, Set, TextIO, Union, cast, Iterator
+import tempfile
+import time
+from typing import Dict, Iterable, List, Optional, Set, TextIO, Union, cast, Iterator
+from contextlib import contextmanager
 
 from .exceptions import ProjectInitError
 
 from .util import (check_version_ge, chown_root, command_exists,
                     download_url_file, file_contents, files_are_identical,
-                    get_current_os_user, get_tmp_dir, os_group_includes_user,
+                    get_current_os_user, get_tmp_dir, hash_pathname, os_group_includes_user,
                     run_once, sudo_check_call,
                     sudo_check_output_stderr_exception, unix_mv, os_group_exists,
-                    get_gid_of_group, gid_exists, get_group_of_gid)
+                    get_gid_of_group, gid_exists, get_group_of_gid, clear_os_group_cache)
+
+os_package_list_max_age: float = 3600.0
+"""The age in seconds below which apt-get package metadata updated by another process is considered current"""
 
 _os_package_metadata_stale: bool = True
+_os_package_metadata_invalidated: bool = False
 def invalidate_os_package_list() -> None:
-  global _os_package_metadata_stale
+  global _os_package_metadata_stale, _os_package_metadata_invalidated
   _os_package_metadata_stale = True
+  _os_package_metadata_invalidated = True
+
+def _get_newest_mtime(pathnames: Iterable[str]) -> Optional[float]:
+  """Returns the newest st_mtime of the files in a list that exist, or None if none exist"""
+  result: Optional[float] = None
+  for pathname in pathnames:
+    try:
+      mtime = os.stat(pathname).st_mtime
+    except FileNotFoundError:
+      continue
+    if result is None or mtime > result:
+      result = mtime
+  return result
+
+_apt_lists_dir = '/var/lib/apt/lists'
+_apt_sources_list = '/etc/apt/sources.list'
+_apt_sources_dir = '/etc/apt/sources.list.d'
+
+def _get_os_package_list_stamp_file() -> str:
+  """Returns the pathname of the file touched after each successful 'apt-get update' by this user"""
+  return os.path.join(get_tmp_dir(), 'apt-get-update.stamp')
+
+def _touch_os_package_list_stamp() -> None:
+  """Records that 'apt-get update' has just completed successfully"""
+  stamp_file = _get_os_package_list_stamp_file()
+  try:
+    with open(stamp_file, 'a', encoding='utf-8'):
+      pass
+    os.utime(stamp_file)
+  except OSError:
+    pass
+
+def _os_package_list_is_recent() -> bool:
+  """Returns True if apt-get package metadata was refreshed less than os_package_list_max_age
+     seconds ago and no apt sources have changed since.
+
+  The refresh time is the mtime of a stamp file touched after each successful
+  update_os_package_list(). The mtimes of apt's own index files cannot be used; apt sets
+  them to the server's Last-Modified time, not the time of the update. The stamp is
+  ignored if /var/lib/apt/lists has no index files (e.g., they were deleted, as
+  Dockerfiles commonly do).
+  """
+  try:
+    updated = os.stat(_get_os_package_list_stamp_file()).st_mtime
+  except OSError:
+    return False
+  if not 0 <= time.time() - updated < os_package_list_max_age:
+    return False
+  try:
+    names = os.listdir(_apt_lists_dir)
+  except OSError:
+    return False
+  if not any(name.endswith('_InRelease') or name.endswith('_Release') or '_Packages' in name for name in names):
+    return False
+  # Files edited in place don't change their directory's mtime, so check each of them too
+  sources = [ _apt_sources_list, _apt_sources_dir ]
+  try:
+    sources.extend(os.path.join(_apt_sources_dir, name) for name in os.listdir(_apt_sources_dir))
+  except FileNotFoundError:
+    pass
+  sources_updated = _get_newest_mtime(sources)
+  return sources_updated is None or sources_updated <= updated
+
+@contextmanager
+def _private_tmp_file(prefix: str, suffix: str) -> Iterator[str]:
+  """Context manager that creates a uniquely named empty file in this user's private temporary
+     directory, and removes it on exit if it has not been moved away."""
+  fd, tmp_file = tempfile.mkstemp(prefix=prefix, suffix=suffix, dir=get_tmp_dir())
+  os.close(fd)
+  try:
+    yield tmp_file
+  finally:
+    try:
+      os.unlink(tmp_file)
+    except FileNotFoundError:
+      pass
+
+def _get_gpg_keyring_stamp_file(dest_file: str) -> str:
+  """Returns the pathname of the file recording where and when a GPG keyring was downloaded"""
+  return os.path.join(get_tmp_dir(), f"gpg-keyring-{hash_pathname(dest_file)}.json")
+
+def _get_gpg_keyring_signature(dest_file: str) -> Optional[List[int]]:
+  """Returns the inode number, size and modification time of a GPG keyring, or None if it does not exist"""
+  try:
+    st = os.stat(dest_file)
+  except FileNotFoundError:
+    return None
+  return [ st.st_ino, st.st_size, st.st_mtime_ns ]
+
+def _get_gpg_keyring_download_time(
+      url: str,
+      dest_file: str,
+      filter_cmd: Optional[Union[str, List[str]]],
+    ) -> Optional[float]:
+  """Returns the time at which an existing GPG keyring was downloaded from url through filter_cmd,
+     or None if it was not known to be, or has been modified since."""
+  signature = _get_gpg_keyring_signature(dest_file)
+  if signature is None:
+    return None
+  try:
+    with open(_get_gpg_keyring_stamp_file(dest_file), 'r', encoding='utf-8') as f:
+      stamp = json.load(f)
+  except (OSError, ValueError):
+    return None
+  if not isinstance(stamp, dict) or [ stamp.get('url'), stamp.get('filter_cmd'), stamp.get('signature') ] != [ url, filter_cmd, signature ]:
+    return None
+  downloaded = stamp.get('downloaded')
+  return float(downloaded) if isinstance(downloaded, (int, float)) else None
+
+def _set_gpg_keyring_download_time(
+      url: str,
+      dest_file: str,
+      filter_cmd: Optional[Union[str, List[str]]],
+      downloaded: float,
+    ) -> None:
+  """Records that a GPG keyring is current as of a download from url through filter_cmd"""
+  stamp = {
+      'url': url,
+      'filter_cmd': filter_cmd,
+      'signature': _get_gpg_keyring_signature(dest_file),
+      'downloaded': downloaded,
+    }
+  try:
+    with open(_get_gpg_keyring_stamp_file(dest_file), 'w', encoding='utf-8') as f:
+      json.dump(stamp, f)
+  except OSError:
+    pass
 
 def update_gpg_keyring(
       url: str,
@@ -38,6 +172,9 @@ def update_gpg_keyring(
     ) -> None:
   """Create or update a GPG keyring. Used to verify 3rd-party apt packages
 
+  If the keyring was last written by this function from the same url and filter_cmd, and has not
+  been modified since, it is only downloaded again if the server reports that it has changed.
+
   Args:
       url (str):            The URL to download the GPG keyring from. The content can be transformed with filter_cmd.
       dest_file (str):      The path to the file to create or update. Normally this
@@ -53,14 +190,21 @@ def update_gpg_keyring(
   """
   if stderr is None:
     stderr = sys.stderr
-  tmp_file_gpg = os.path.join(get_tmp_dir(), "tmp_gpg_keyring.gpg")
-  download_url_file(url, tmp_file_gpg, filter_cmd=filter_cmd)
-  if os.path.exists(dest_file) and files_are_identical(dest_file, tmp_file_gpg):
-    return
-  print(f"Updating GPG keyring at {dest_file} (sudo required)", file=stderr)
-  os.chmod(tmp_file_gpg, 0o644)
-  chown_root(tmp_file_gpg, sudo_reason=f"Installing GPG keyring to {dest_file}")
-  unix_mv(tmp_file_gpg, dest_file, use_sudo=True, sudo_reason=f"Installing GPG keyring to {dest_file}")
+  downloaded = time.time()
+  with _private_tmp_file("tmp_gpg_keyring-", ".gpg") as tmp_file_gpg:
+    if not download_url_file(
+          url,
+          tmp_file_gpg,
+          filter_cmd=filter_cmd,
+          if_modified_since=_get_gpg_keyring_download_time(url, dest_file, filter_cmd),
+        ):
+      return
+    if not os.path.exists(dest_file) or not files_are_identical(dest_file, tmp_file_gpg):
+      print(f"Updating GPG keyring at {dest_file} (sudo required)", file=stderr)
+      os.chmod(tmp_file_gpg, 0o644)
+      chown_root(tmp_file_gpg, sudo_reason=f"Installing GPG keyring to {dest_file}")
+      unix_mv(tmp_file_gpg, dest_file, use_sudo=True, sudo_reason=f"Installing GPG keyring to {dest_file}")
+  _set_gpg_keyring_download_time(url, dest_file, filter_cmd, downloaded)
 
 def install_gpg_keyring_if_missing(
       url: str,
@@ -88,6 +232,13 @@ def install_gpg_keyring_if_missing(
   if not os.path.exists(dest_file):
     update_gpg_keyring(url, dest_file, filter_cmd=filter_cmd, stderr=stderr)
 
+_dpkg_arch_of_64bit_machine: Dict[str, str] = {
+    'x86_64': 'amd64',
+    'aarch64': 'arm64',
+    'ppc64le': 'ppc64el',
+    's390x': 's390x',
+  }
+
 @run_once
 def get_dpkg_arch() -> str:
   """Returns the dpkg architecture string for the current system.
@@ -95,6 +246,13 @@ def get_dpkg_arch() -> str:
   arm64: 64-bit ARM systems including Raspberry Pi 3 and 4, Mac M1, etc.
   amd64: 64-bit x86 systems including Intel and AMD
   """
+  # Common 64-bit machines map directly. The kernel's machine type only implies the
+  # userspace architecture if this Python is itself 64-bit (e.g., 32-bit Raspberry Pi OS
+  # runs an aarch64 kernel with armhf userspace), so anything else asks dpkg.
+  if struct.calcsize('P') == 8:
+    dpkg_arch = _dpkg_arch_of_64bit_machine.get(platform.machine())
+    if not dpkg_arch is None:
+      return dpkg_arch
   result = subprocess.check_output(['dpkg', '--print-architecture'])
   dpkg_arch = result.decode('utf-8').rstrip()
   return dpkg_arch
@@ -107,6 +265,10 @@ def update_os_package_list(force: bool=False, stderr: Optional[TextIO]=None) ->
   this function is called successfully. After that, the list becomes stale
   if new apt sources are added.
 
+  A list that is stale only because this process has not updated it yet is treated
+  as current if this function last updated it less than os_package_list_max_age
+  seconds ago (e.g., in a previous run) and no apt sources have changed since.
+
   Args:
       force (bool, optional): Force an update even if the list is not stale. Defaults to False.
       stderr (Optional[TextIO], optional): Optional stream to which stderr output will be written. Defaults to sys.stderr.
@@ -115,9 +277,13 @@ def update_os_package_list(force: bool=False, stderr: Optional[TextIO]=None) ->
   if force:
     _os_package_metadata_stale = True
 
+  if _os_package_metadata_stale and not force and not _os_package_metadata_invalidated and _os_package_list_is_recent():
+    _os_package_metadata_stale = False
+
   if _os_package_metadata_stale:
     sudo_check_call(['apt-get', 'update'], sudo_reason="Updating available apt-get package metadata", stderr=stderr)
     _os_package_metadata_stale = False
+    _touch_os_package_list_stamp()
 
 def update_apt_sources_list(dest_file: str, signed_by: str, url: str, *args, stderr: Optional[TextIO]=None) -> None:
   """Create or update an apt-get sources list file. Used to add 3rd-party apt repositories.
@@ -138,20 +304,21 @@ def update_apt_sources_list(dest_file: str, signed_by: str, url: str, *args, std
       stderr (Optional[TextIO], optional): Optional stream to which stderr output will be written. Defaults to sys.stderr.
   """
   arch = get_dpkg_arch()
-  tmp_file = os.path.join(get_tmp_dir(), "tmp_apt_source.list")
-  with open(tmp_file, "w", encoding='utf-8') as f:
-    print(f"deb [arch={arch} signed-by={signed_by}] {url} {' '.join(args)}", file=f)
-  if os.path.exists(dest_file):
-    if files_are_identical(tmp_file, dest_file):
-      return
-    sudo_reason= f"Updating apt-get sources list for {dest_file}; old=<{file_contents(dest_file).rstrip()}>"
-  else:
-    sudo_reason= f"Creating apt-get sources list for {dest_file}"
-  sudo_reason += f", new=<{file_contents(tmp_file).rstrip()}>"
-  os.chmod(tmp_file, 0o644)
-  chown_root(tmp_file, sudo_reason=sudo_reason)
-  invalidate_os_package_list()
-  unix_mv(tmp_file, dest_file, use_sudo=True, sudo_reason=sudo_reason)
+  line = f"deb [arch={arch} signed-by={signed_by}] {url} {' '.join(args)}"
+  with _private_tmp_file("tmp_apt_source-", ".list") as tmp_file:
+    with open(tmp_file, "w", encoding='utf-8') as f:
+      print(line, file=f)
+    if os.path.exists(dest_file):
+      if files_are_identical(tmp_file, dest_file):
+        return
+      sudo_reason= f"Updating apt-get sources list for {dest_file}; old=<{file_contents(dest_file).rstrip()}>"
+    else:
+      sudo_reason= f"Creating apt-get sources list for {dest_file}"
+    sudo_reason += f", new=<{line.rstrip()}>"
+    os.chmod(tmp_file, 0o644)
+    chown_root(tmp_file, sudo_reason=sudo_reason)
+    invalidate_os_package_list()
+    unix_mv(tmp_file, dest_file, use_sudo=True, sudo_reason=sudo_reason)
   update_os_package_list(stderr=stderr)
 
 def install_apt_sources_list_if_missing(dest_file: str, signed_by: str, url: str, *args, stderr: Optional[TextIO]=None) -> None:
@@ -176,29 +343,129 @@ def install_apt_sources_list_if_missing(dest_file: str, signed_by: str, url: str
   if not os.path.exists(dest_file):
     update_apt_sources_list(dest_file, signed_by, url, *args, stderr=stderr)
 
+def _as_package_name_list(package_names: Optional[Union[str, Iterable[str]]]) -> List[str]:
+  """Converts a package name, a collection of package names, or None to a list of package names"""
+  if isinstance(package_names, list):
+    return package_names
+  if package_names is None:
+    return []
+  if isinstance(package_names, str):
+    return [ package_names ]
+  return list(package_names)
+
+_os_package_versions: Dict[str, Optional[str]] = {}
+"""Cache of installed OS package versions by package name; None if the package is not installed"""
+
+def invalidate_os_package_cache() -> None:
+  """Clears cached OS (dpkg) package versions. Called automatically after packages are
+     installed, upgraded, or removed through this module."""
+  _os_package_versions.clear()
+
+def _os_packages_changed() -> None:
+  """Discards cached state that may be stale after OS packages are installed, upgraded, or removed.
+
+  Package maintainer scripts can create OS groups (e.g., docker-ce creates 'docker'), so the
+  OS group cache is cleared along with the package version cache.
+  """
+  invalidate_os_package_cache()
+  clear_os_group_cache()
+
 def get_os_package_version(package_name: str) -> str:
   """Returns the version of an installed OS (dpkg) package.
 
   The returned version string is a fully qualified dpkg version string; e.g.,
   "5:24.0.5-1~ubuntu.22.04~jammy".
+
+  Results are cached until invalidate_os_package_cache() is called.
+  """
+  result = _os_package_versions.get(package_name)
+  if result is None:
+    stdout_bytes = sudo_check_output_stderr_exception(
+        ['dpkg-query',
+            '--showformat=${Version}', '--show', package_name
+          ],
+        use_sudo=False
+      )
+    result = stdout_bytes.decode('utf-8').rstrip()
+    _os_package_versions[package_name] = result if result != '' else None
+  return result
+
+def get_installed_os_package_versions(package_names: List[str]) -> Dict[str, str]:
+  """Returns the versions of the installed OS (dpkg) packages in a list, using a single dpkg-query.
+
+  Results are cached until invalidate_os_package_cache() is called, and only packages
+  that are not already cached are queried.
+
+  Args:
+      package_names (List[str]): The package names to look up.
+
+  Returns:
+      Dict[str, str]: A dictionary mapping each name in package_names that is installed to its
+                      fully qualified dpkg version string. Names that are not installed are omitted.
   """
-  stdout_bytes = sudo_check_output_stderr_exception(
-      ['dpkg-query',
-          '--showformat=${Version}', '--show', package_name
-        ],
-      use_sudo=False
+  batch_names: List[str] = []
+  for package_name in package_names:
+    if package_name in _os_package_versions:
+      continue
+    if any(c in package_name for c in ':*?['):
+      # Arch-qualified names and patterns don't map back to a single dpkg-query output line,
+      # so look them up individually
+      try:
+        get_os_package_version(package_name)
+      except subprocess.CalledProcessError:
+        _os_package_versions[package_name] = None
+    else:
+      batch_names.append(package_name)
+  if len(batch_names) > 0:
+    # dpkg-query exits nonzero if any package is unknown, but still reports the others
+    proc = subprocess.run(
+        ['dpkg-query', '--showformat=${Package}\t${Version}\n', '--show', '--'] + batch_names,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        check=False,
+      )
+    versions: Dict[str, str] = {}
+    for line in proc.stdout.decode('utf-8').splitlines():
+      name, _, version = line.partition('\t')
+      if version != '':
+        versions.setdefault(name, version)
+    for package_name in batch_names:
+      _os_package_versions[package_name] = versions.get(package_name)
+  result: Dict[str, str] = {}
+  for package_name in package_names:
+    cached_version: Optional[str] = _os_package_versions.get(package_name)
+    if not cached_version is None:
+      result[package_name] = cached_version
+  return result
+
+def _get_os_package_candidate_versions(package_names: List[str]) -> Dict[str, str]:
+  """Returns the versions apt-get would install for a list of OS (dpkg) packages, using a
+     single 'apt-cache policy'. Packages that are unknown or have no candidate are omitted."""
+  result: Dict[str, str] = {}
+  if len(package_names) == 0:
+    return result
+  env = dict(os.environ)
+  env['LC_ALL'] = 'C'
+  proc = subprocess.run(
+      ['apt-cache', 'policy', '--'] + package_names,
+      stdout=subprocess.PIPE,
+      stderr=subprocess.DEVNULL,
+      env=env,
+      check=False,
     )
-  return stdout_bytes.decode('utf-8').rstrip()
+  package_name: Optional[str] = None
+  for line in proc.stdout.decode('utf-8', errors='replace').splitlines():
+    if not line.startswith(' ') and line.endswith(':'):
+      package_name = line[:-1]
+    elif not package_name is None:
+      key, _, value = line.strip().partition(': ')
+      if key == 'Candidate' and value != '(none)':
+        result[package_name] = value
+  return result
 
 def os_package_is_installed(package_name: str) -> bool:
   """Returns True if the specified OS (dpkg) package is installed"""
-  result: bool = False
-  try:
-    if get_os_package_version(package_name) != '':
-      result = True
-  except subprocess.CalledProcessError:
-    pass
-  return result
+  return package_name in get_installed_os_package_versions([ package_name ])
 
 def uninstall_os_packages(package_names: Union[str, List[str]], stderr: Optional[TextIO] = None) -> None:
   """Uninstall OS (dpkg) package(s).
@@ -206,13 +473,16 @@ def uninstall_os_packages(package_names: Union[str, List[str]], stderr: Optional
   Package names that are not installed are ignored. If any package is installed,
   sudo will be used to uninstall it.
   """
-  if not isinstance(package_names, list):
-    package_names = [ package_names ]
+  package_names = _as_package_name_list(package_names)
 
-  filtered = [ x for x in package_names if os_package_is_installed(x) ]
+  installed = get_installed_os_package_versions(package_names)
+  filtered = [ x for x in package_names if x in installed ]
 
   if len(filtered) > 0:
-    sudo_check_call(['apt-get', 'remove'] + filtered, stderr=stderr, sudo_reason=f"Removing packages {filtered}")
+    try:
+      sudo_check_call(['apt-get', 'remove'] + filtered, stderr=stderr, sudo_reason=f"Removing packages {filtered}")
+    finally:
+      _os_packages_changed()
 
 def install_os_packages(package_names: Union[str, List[str]], stderr: Optional[TextIO] = None) -> None:
   """Install OS (dpkg) package(s).
@@ -222,13 +492,16 @@ def install_os_packages(package_names: Union[str, List[str]], stderr: Optional[T
 
   Packages that are already installed are not upgraded.
   """
-  if not isinstance(package_names, list):
-    package_names = [ package_names ]
+  package_names = _as_package_name_list(package_names)
 
-  filtered = [ x for x in package_names if not os_package_is_installed(x) ]
+  installed = get_installed_os_package_versions(package_names)
+  filtered = [ x for x in package_names if not x in installed ]
 
   if len(filtered) > 0:
-    sudo_check_call(['apt-get', 'install', '-y'] + filtered, stderr=stderr, sudo_reason=f"Installing packages {filtered}")
+    try:
+      sudo_check_call(['apt-get', 'install', '-y'] + filtered, stderr=stderr, sudo_reason=f"Installing packages {filtered}")
+    finally:
+      _os_packages_changed()
 
 
 def update_and_install_os_packages(package_names: Union[str, List[str]], stderr: Optional[TextIO] = None) -> None:
@@ -242,25 +515,30 @@ def update_and_install_os_packages(package_names: Union[str, List[str]], stderr:
   Packages that are already installed are not upgraded.
   """
 
-  if not isinstance(package_names, list):
-    package_names = [ package_names ]
+  package_names = _as_package_name_list(package_names)
 
-  filtered = [ x for x in package_names if not os_package_is_installed(x) ]
+  installed = get_installed_os_package_versions(package_names)
+  filtered = [ x for x in package_names if not x in installed ]
 
   if len(filtered) > 0:
     update_os_package_list()
-    sudo_check_call(['apt-get', 'install', '-y'] + filtered, stderr=stderr, sudo_reason=f"Installing packages {filtered}")
+    try:
+      sudo_check_call(['apt-get', 'install', '-y'] + filtered, stderr=stderr, sudo_reason=f"Installing packages {filtered}")
+    finally:
+      _os_packages_changed()
 
 def upgrade_os_packages(package_names: Union[str, List[str]], stderr: Optional[TextIO] = None) -> None:
   """Upgrade OS (dpkg) package(s).
 
   If there are any listed packages, they must be installed, and sudo is used to upgrade them.
   """
-  if not isinstance(package_names, list):
-    package_names = [ package_names ]
+  package_names = _as_package_name_list(package_names)
 
   if len(package_names) > 0:
-    sudo_check_call(['apt-get', 'upgrade', '-y'] + package_names, stderr=stderr, sudo_reason=f"Upgrading packages {package_names}")
+    try:
+      sudo_check_call(['apt-get', 'upgrade', '-y'] + package_names, stderr=stderr, sudo_reason=f"Upgrading packages {package_names}")
+    finally:
+      _os_packages_changed()
 
 
 def update_and_upgrade_os_packages(package_names: Union[str, List[str]], stderr: Optional[TextIO] = None) -> None:
@@ -268,14 +546,21 @@ def update_and_upgrade_os_packages(package_names: Union[str, List[str]], stderr:
 
   If there are any listed packages, then:
      1. If the list of available apt-get packages is stale, sudo is used to update it.
-     2  sudo is used to update all listed packages, which must be installed.
+     2  sudo is used to update all listed packages, which must be installed. Packages
+        whose installed version is already the apt-get candidate version are skipped.
   """
-  if not isinstance(package_names, list):
-    package_names = [ package_names ]
+  package_names = _as_package_name_list(package_names)
 
   if len(package_names) > 0:
     update_os_package_list()
-    sudo_check_call(['apt-get', 'upgrade', '-y'] + package_names, stderr=stderr, sudo_reason=f"Upgrading packages {package_names}")
+    installed = get_installed_os_package_versions(package_names)
+    candidates = _get_os_package_candidate_versions(package_names)
+    filtered = [ x for x in package_names if installed.get(x) is None or installed.get(x) != candidates.get(x) ]
+    if len(filtered) > 0:
+      try:
+        sudo_check_call(['apt-get', 'upgrade', '-y'] + filtered, stderr=stderr, sudo_reason=f"Upgrading packages {filtered}")
+      finally:
+        _os_packages_changed()
 
 class PackageList:
   """A dynamically buildable list of OS (dpkg) packages to install, upgrade, or uninstall."""
@@ -305,13 +590,10 @@ class PackageList:
             An optional list of package names to add to the end of list. Duplicate
             entries are removed. Defaults to None.
     """
-    if not package_names is None:
-      if not isinstance(package_names, list):
-        package_names = [ package_names ]
-      for package_name in package_names:
-        if not package_name in self._package_name_set:
-          self._package_names.append(package_name)
-          self._package_name_set.add(package_name)
+    # dict.fromkeys removes duplicates within package_names while preserving order
+    new_names = [ x for x in dict.fromkeys(_as_package_name_list(package_names)) if not x in self._package_name_set ]
+    self._package_names.extend(new_names)
+    self._package_name_set.update(new_names)
 
   def add_packages_if_missing(self, package_names: Optional[Union[str, List[str]]]) -> None:
     """Add package names to the end of the PackageList if they are not installed.
@@ -321,12 +603,10 @@ class PackageList:
             An optional list of package names to add to the end of list. Installed
             packages are omitted. Duplicate entries are removed. Defaults to None.
     """
-    if not package_names is None:
-      if not isinstance(package_names, list):
-        package_names = [ package_names ]
-      for package_name in package_names:
-        if not package_name in self._package_name_set and not os_package_is_installed(package_name):
-          self.add_packages(package_name)
+    candidates = [ x for x in _as_package_name_list(package_names) if not x in self._package_name_set ]
+    if len(candidates) > 0:
+      installed = get_installed_os_package_versions(candidates)
+      self.add_packages([ x for x in candidates if not x in installed ])
 
   def add_package_if_cmd_missing(self, cmd: str, package_name: Optional[str]=None) -> None:
     """Adds a package to the end of the PackageList if it is not already in the PackageList and
@@ -400,8 +680,8 @@ class PackageList:
     return package_name in self._package_name_set
 
   def __iter__(self) -> Iterator[str]:
-    """Returns an iterator over the package names in the PackageList."""
-    return sorted(self._package_names).__iter__()
+    """Returns an iterator over the package names in the PackageList, in the order they were added."""
+    return iter(self._package_names)
 
   def is_empty(self) -> bool:
     """Returns True if the PackageList is empty."""
@@ -457,7 +737,10 @@ def create_os_group(
   if not gid is None:
     cmd.extend( [ '-g', str(gid) ] )
   cmd.append(group_name)
-  sudo_check_output_stderr_exception(cmd, stderr=stderr, sudo_reason=f"Adding OS group '{group_name}'")
+  try:
+    sudo_check_output_stderr_exception(cmd, stderr=stderr, sudo_reason=f"Adding OS group '{group_name}'")
+  finally:
+    clear_os_group_cache()
   new_gid = get_gid_of_group(group_name)
   if not gid is None and new_gid != gid:
     raise ProjectInitError(f"OS group '{group_name}' successfully created, but created GID {new_gid} does not match required GID {gid}")
@@ -481,10 +764,13 @@ def os_group_add_user(group_name: str, user: Optional[str]=None, stderr: Optiona
   if user is None:
     user = get_current_os_user()
   if not os_group_includes_user(group_name, user):
-    sudo_check_output_stderr_exception(
-        [
-            'usermod', '-a', '-G', group_name, user
-          ],
-        stderr=stderr,
-        sudo_reason=f"Adding user '{user}' to OS group '{group_name}'"
-      )
+    try:
+      sudo_check_output_stderr_exception(
+          [
+              'usermod', '-a', '-G', group_name, user
+            ],
+          stderr=stderr,
+          sudo_reason=f"Adding user '{user}' to OS group '{group_name}'"
+        )
+    finally:
+      clear_os_group_cache()
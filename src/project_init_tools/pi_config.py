@@ -12,7 +12,7 @@ from typing import Optional
 import os
 
 from .internal_types import Jsonable, JsonableDict
-from .util import get_git_root_dir, yaml, YamlLoader
+from .util import get_git_root_dir, abspath_expanduser, yaml, YamlLoader
 from .exceptions import ProjectInitError
 
 class ProjectInitConfig:
@@ -32,7 +32,7 @@ class ProjectInitConfig:
         raise ProjectInitError("Could not locate Git project root directory; please run inside git working directory or use -C")
       config_file = os.path.join(project_root_dir, 'project-init/config.yaml')
 
-    self.config_file = os.path.abspath(os.path.normpath(os.path.expanduser(config_file)))
+    self.config_file = abspath_expanduser(config_file)
     with open(self.config_file, encoding='utf-8') as f:
       self.config_data = yaml.load(f, Loader=YamlLoader)
     self.project_init_dir = os.path.dirname(self.config_file)
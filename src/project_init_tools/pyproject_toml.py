@@ -15,7 +15,7 @@ from tomlkit.items import Table, Item, Key
 from tomlkit.container import Container, OutOfOrderTableProxy
 from tomlkit.exceptions import TOMLKitError, ParseError
 from .exceptions import ProjectInitError
-from .util import get_git_root_dir, atomic_mv
+from .util import get_git_root_dir, abspath_expanduser, atomic_mv
 
 class PyprojectToml:
   project_dir: str
@@ -27,7 +27,7 @@ class PyprojectToml:
     if project_dir is None:
       project_dir = get_git_root_dir(starting_dir=starting_dir)
     elif not project_dir is None:
-      project_dir = os.path.abspath(os.path.normpath(os.path.expanduser(project_dir)))
+      project_dir = abspath_expanduser(project_dir)
     if project_dir is None:
       raise ValueError("Not in a git project, and project directory not provided")
     if not os.path.isdir(project_dir):
@@ -16,6 +16,7 @@ from typing import (
     Callable,
     Any,
     Set,
+    FrozenSet,
     Tuple,
     Generator,
     overload,
@@ -29,34 +30,50 @@ from .exceptions import ProjectInitError, CalledProcessErrorWithStderrMessage
 from .internal_types import Jsonable, JsonableDict, Self, NamedTuple
 
 import json
+import email.utils
 import hashlib
+import errno
 import string
 import os
-from urllib.parse import urlparse, ParseResult, urlunparse, unquote as url_unquote
-import pathlib
+from urllib.parse import urlparse, ParseResult, urlunparse, unquote as url_unquote, quote_from_bytes as url_quote_from_bytes
 import subprocess
 import threading
 import tempfile
 import secrets
-import boto3
-from boto3.session import Session as BotoAwsSession
-from botocore.session import Session as BotocoreSession
 import sys
 import platform
 import grp
+import pwd
 import filecmp
+import mmap
+import stat
 import urllib3
 import shutil
 import shlex
 from collections import defaultdict
 from functools import lru_cache, _make_key
 import yaml
+import warnings
 
 try:
   from yaml import CLoader as YamlLoader, CDumper as YamlDumper
 except ImportError:
   from yaml import Loader as YamlLoader, Dumper as YamlDumper  #type: ignore[misc]
 
+# crypt is deprecated, and removed from the standard library in Python 3.13
+try:
+  with warnings.catch_warnings():
+    warnings.simplefilter('ignore', DeprecationWarning)
+    import crypt as _crypt  # pylint: disable=deprecated-module
+except ImportError:
+  _crypt = None  # type: ignore[assignment]
+
+# boto3 takes a long time to import and is only needed by the AWS helpers,
+# so it is imported on first use
+if TYPE_CHECKING:
+  from boto3.session import Session as BotoAwsSession
+  from botocore.session import Session as BotocoreSession
+
 # mypy really struggles with this
 if TYPE_CHECKING:
   from subprocess import _CMD, _FILE, _ENV
@@ -67,14 +84,6 @@ else:
   _ENV = Any
   StrOrBytesPath = Any
 
-class _RunOnceState:
-  has_run: bool = False
-  result: Any = None
-  lock: threading.Lock
-
-  def __init__(self):
-    self.lock = threading.Lock()
-
 def run_once(func):
   """Function decorator that caches the result of the first call to a function.
 
@@ -92,17 +101,57 @@ def run_once(func):
       _type_: A decorated function that is thread safe and returns the
               value returned from the first call to func.
   """
-  state = _RunOnceState()
+  # State is kept in closure cells, which are cheaper to read than attributes
+  has_run: bool = False
+  result: Any = None
+  lock = threading.Lock()
 
   def _run_once(*args, **kwargs) -> Any:
-    if not state.has_run:
-      with state.lock:
-        if not state.has_run:
-          state.result = func(*args, **kwargs)
-          state.has_run = True
-    return state.result
+    nonlocal has_run, result
+    if not has_run:
+      with lock:
+        if not has_run:
+          result = func(*args, **kwargs)
+          has_run = True
+    return result
   return _run_once
 
+def _expanduser(pathname: str) -> str:
+  """os.path.expanduser(), skipping the HOME/pwd lookup for pathnames that do not begin with '~'"""
+  return os.path.expanduser(pathname) if pathname.startswith('~') else pathname
+
+@lru_cache(maxsize=1024)
+def _normpath_abs(pathname: str) -> str:
+  """Cached os.path.normpath() for absolute pathnames, whose result does not depend on cwd or HOME"""
+  return os.path.normpath(pathname)
+
+def abspath_expanduser(pathname: str, cwd: Optional[str]=None) -> str:
+  """Converts a pathname to a normalized absolute pathname, expanding a leading '~'.
+
+  Equivalent to os.path.abspath(os.path.join(os.path.expanduser(cwd), os.path.expanduser(pathname))),
+  but skips expanduser() for strings that do not begin with '~', and skips cwd entirely
+  if pathname is already absolute.
+
+  Args:
+      pathname (str): A relative or absolute pathname, which may begin with '~'.
+      cwd (Optional[str], optional):
+                  The base directory to use for relative pathnames. If None, "."
+                  will be used. Defaults to None.
+
+  Returns:
+      str: The normalized absolute pathname
+  """
+  pathname = _expanduser(pathname)
+  if (os.sep == '/' and pathname.startswith('/') and not '//' in pathname and not '/.' in pathname
+      and not pathname.endswith('/')):
+    # Already absolute and normalized (the common case for PATH entries)
+    return pathname
+  if os.path.isabs(pathname):
+    return _normpath_abs(pathname)
+  if not cwd is None:
+    pathname = os.path.join(_expanduser(cwd), pathname)
+  return os.path.abspath(pathname)
+
 @run_once
 def get_tmp_dir() -> str:
   """Returns a temporary directory that is private to this user
@@ -116,11 +165,18 @@ def get_tmp_dir() -> str:
     tmp_dir = os.path.join(parent_dir, f"user-{os.getuid()}")
   else:
     tmp_dir = os.path.join(parent_dir, 'tmp')
-  if not os.path.exists(tmp_dir):
+  try:
     os.mkdir(tmp_dir, mode=0o700)
+  except FileExistsError:
+    pass
   return tmp_dir
 
 
+@lru_cache(maxsize=4096)
+def _hash_abs_pathname(pathname: str) -> str:
+  """Cached implementation of hash_pathname. pathname must be canonicalized."""
+  return hashlib.sha1(pathname.encode("utf-8")).hexdigest()
+
 def hash_pathname(pathname: str) -> str:
   """Returns an SHA1 hash of a pathname. Used to create fixed-sized
      identifiers without delimeters that will always be the same
@@ -133,9 +189,28 @@ def hash_pathname(pathname: str) -> str:
   Returns:
       str: a hex-encoded SHA1 hash
   """
-  result = hashlib.sha1(os.path.abspath(os.path.expanduser(pathname)).encode("utf-8")).hexdigest()
+  result = _hash_abs_pathname(abspath_expanduser(pathname))
   return result
 
+def hash_pathnames(pathnames: List[str], cwd: Optional[str]=None) -> List[str]:
+  """Returns the hash_pathname() value of each of a list of pathnames.
+
+  Equivalent to [ hash_pathname(x) for x in pathnames ], but relative pathnames are
+  resolved against a single base directory that is computed once.
+
+  Args:
+      pathnames (List[str]): A list of pathnames to be hashed. Each pathname is
+                      canonicalized before hashing.
+      cwd (Optional[str], optional):
+                  The base directory to use for relative pathnames. If None, the
+                  current working directory is used. Defaults to None.
+
+  Returns:
+      List[str]: a list of hex-encoded SHA1 hashes, in the same order as pathnames
+  """
+  base_dir = abspath_expanduser('.' if cwd is None else cwd)
+  return [ _hash_abs_pathname(abspath_expanduser(x, cwd=base_dir)) for x in pathnames ]
+
 def full_name_of_type(t: Type) -> str:
   """Returns the fully qualified name of a python type
 
@@ -149,7 +224,7 @@ def full_name_of_type(t: Type) -> str:
   if module == 'builtins':
     result: str = t.__qualname__
   else:
-    result = module + '.' + t.__qualname__
+    result = f"{module}.{t.__qualname__}"
   return result
 
 def full_type(o: Any) -> str:
@@ -164,11 +239,31 @@ def full_type(o: Any) -> str:
   """
   return full_name_of_type(o.__class__)
 
+def _clone_json_value(data: Any) -> Jsonable:
+  """Recursive implementation of clone_json_data"""
+  if data is None or isinstance(data, (str, int, float, bool)):
+    return data
+  if isinstance(data, dict):
+    result: Dict[str, Jsonable] = {}
+    for k, v in data.items():
+      if not isinstance(k, str):
+        if not k is None and not isinstance(k, (int, float, bool)):
+          raise TypeError(f"keys must be str, int, float, bool or None, not {full_type(k)}")
+        # Same key coercion as json.dumps; e.g., 1 -> "1", True -> "true", None -> "null"
+        k = json.dumps(k)
+      result[k] = _clone_json_value(v)
+    return result
+  if isinstance(data, (list, tuple)):
+    return [ _clone_json_value(v) for v in data ]
+  raise TypeError(f"Object of type {full_type(data)} is not JSON serializable")
+
 def clone_json_data(data: Jsonable) -> Jsonable:
-  """Makes a deep copy of a json-serializable value, by serializing and then unserializing.
+  """Makes a deep copy of a json-serializable value, with the same result as serializing and then unserializing.
 
      Equivalent to deepcopy, but also validates that the data is simple Jsonable data.
-     Simple immutable scalar values are directly retuurned without serialization.
+     Simple immutable scalar values are directly retuurned without copying. As with a
+     JSON round trip, tuples are converted to lists and non-string dict keys are converted
+     to strings.
 
   Args:
       data (Jsonable): A JSON-serializable value
@@ -179,9 +274,23 @@ def clone_json_data(data: Jsonable) -> Jsonable:
   Returns:
       Jsonable: A deep copy of the provided value, which can be modified without affecting the original.
   """
-  if not data is None and not isinstance(data, (str, int, float, bool)):
-    data = json.loads(json.dumps(data))
-  return data
+  return _clone_json_value(data)
+
+# Strings that urlparse would treat as a bare path and return unchanged: no
+# scheme, netloc, params, query or fragment, and nothing urlparse strips.
+_bare_path_re = re.compile(r'(?![\x00-\x20]|//)[^:;?#\t\r\n]*\Z')
+
+# Scheme, netloc and path of a URL with a scheme, matching what urlparse
+# returns. URLs with characters urlparse strips or validates specially
+# (tab/CR/LF, brackets or non-ASCII in the netloc) do not match.
+_url_parts_re = re.compile(
+    r'(?=[^\t\r\n]*\Z)(?P<scheme>[A-Za-z][A-Za-z0-9+.\-]*):'
+    r'(?:(?!//)|//(?P<netloc>[^/?#\[\]\x80-\U0010ffff]*)(?=[/?#]|\Z))'
+    r'(?P<path>[^?#]*)'
+  )
+
+# file:// URL hosts that refer to the local root directory
+_local_file_url_hosts = frozenset(('', 'localhost', '127.0.0.1'))
 
 def file_url_to_pathname(
       url: str,
@@ -220,27 +329,39 @@ def file_url_to_pathname(
   """
   if cwd is None:
     cwd = '.'
-  url_parts = urlparse(url)
-  if allow_bare_path and url_parts.scheme == '':
-    url_path = url_parts.path
+  if allow_bare_path and not _bare_path_re.match(url) is None:
+    # Plain pathname that urlparse would return unchanged; skip parsing it
+    url_path = url
   else:
-    if url_parts.scheme != 'file':
-      raise ValueError(f"Not a file:// URL: {url}")
-    base_dir = url_unquote(url_parts.netloc)
-    if base_dir in [ '', 'localhost', '127.0.0.1' ]:
-      base_dir = '/'
-    if not allow_relative and base_dir != '/':
-      raise ValueError(f"Relative and network-based file:// backends are not allowed: {url}")
-    url_path = url_unquote(url_parts.path)
-    while url_path.startswith('/'):
-      url_path = url_path[1:]
-    if url_path == '':
-      url_path = base_dir
-    elif base_dir.endswith('/'):
-      url_path = base_dir + url_path
+    m = _url_parts_re.match(url)
+    if m is None:
+      # No scheme, or something unusual that only urlparse handles exactly
+      url_parts = urlparse(url)
+      scheme, netloc, path = url_parts.scheme, url_parts.netloc, url_parts.path
+    else:
+      scheme = m['scheme'].lower()
+      netloc = m['netloc'] or ''
+      path = m['path']
+    if allow_bare_path and scheme == '':
+      url_path = path
     else:
-      url_path = base_dir + '/' + url_path
-  pathname = os.path.abspath(os.path.join(os.path.expanduser(cwd), os.path.expanduser(os.path.normpath(url_path))))
+      if scheme != 'file':
+        raise ValueError(f"Not a file:// URL: {url}")
+      base_dir = url_unquote(netloc) if '%' in netloc else netloc
+      if base_dir in _local_file_url_hosts:
+        base_dir = '/'
+      if not allow_relative and base_dir != '/':
+        raise ValueError(f"Relative and network-based file:// backends are not allowed: {url}")
+      url_path = url_unquote(path) if '%' in path else path
+      url_path = url_path.lstrip('/')
+      if url_path == '':
+        url_path = base_dir
+      elif base_dir.endswith('/'):
+        url_path = base_dir + url_path
+      else:
+        url_path = base_dir + '/' + url_path
+  url_path = os.path.normpath(url_path)
+  pathname = abspath_expanduser(url_path, cwd=cwd)
   return pathname
 
 def pathname_to_file_url(pathname: str, cwd: Optional[str]=None) -> str:
@@ -255,28 +376,155 @@ def pathname_to_file_url(pathname: str, cwd: Optional[str]=None) -> str:
   Returns:
       str: A fully qualified standard "file://" URL.
   """
-  if cwd is None:
-    cwd = '.'
-  pathname = os.path.abspath(os.path.join(os.path.expanduser(cwd), os.path.expanduser(pathname)))
-  url = pathlib.Path(pathname).as_uri()
+  pathname = abspath_expanduser(pathname, cwd=cwd)
+  # Same result as pathlib.Path(pathname).as_uri() for an absolute POSIX path
+  url = 'file://' + url_quote_from_bytes(os.fsencode(pathname))
   return url
 
 
+# (pathname, (st_ino, st_size, st_mtime_ns) or None if the file does not exist) for each config file
+_GitConfigStamp = Tuple[Tuple[str, Optional[Tuple[int, int, int]]], ...]
+
+def _find_git_dir(cwd: str) -> Optional[str]:
+  """Returns the git directory of the repository containing cwd, or None if there is none.
+
+  Found by walking up from cwd looking for ".git" rather than by running git. A ".git"
+  file (linked worktree or submodule) is followed to the directory it names.
+  """
+  dirname = cwd
+  while True:
+    dot_git = os.path.join(dirname, '.git')
+    if os.path.isdir(dot_git):
+      return dot_git
+    if os.path.isfile(dot_git):
+      try:
+        with open(dot_git, 'r', encoding='utf-8') as f:
+          line = f.readline().rstrip('\n')
+      except (OSError, UnicodeDecodeError):
+        line = ''
+      return os.path.join(dirname, line[8:]) if line.startswith('gitdir: ') else None
+    parent_dirname = os.path.dirname(dirname)
+    if parent_dirname == dirname:
+      return None
+    dirname = parent_dirname
+
+def _git_config_pathnames(cwd: str) -> List[str]:
+  """Returns the pathnames of the git config files that may apply to cwd, without running git.
+
+  Used only to detect changes to the config; files pulled in with include.path or
+  includeIf are not listed.
+  """
+  pathnames: List[str] = [ os.environ.get('GIT_CONFIG_SYSTEM') or '/etc/gitconfig' ]
+  global_pathname = os.environ.get('GIT_CONFIG_GLOBAL')
+  if global_pathname is None:
+    home = os.path.expanduser('~')
+    xdg_config_home = os.environ.get('XDG_CONFIG_HOME') or os.path.join(home, '.config')
+    pathnames.append(os.path.join(xdg_config_home, 'git', 'config'))
+    pathnames.append(os.path.join(home, '.gitconfig'))
+  else:
+    pathnames.append(global_pathname)
+  git_dir = os.environ.get('GIT_DIR') or _find_git_dir(cwd)
+  if not git_dir is None:
+    git_dir = os.path.join(cwd, git_dir)
+    pathnames.append(os.path.join(git_dir, 'config'))
+    pathnames.append(os.path.join(git_dir, 'config.worktree'))
+    # a linked worktree's git dir names the main repository's git dir in "commondir"
+    pathnames.append(os.path.join(git_dir, 'commondir'))
+    try:
+      with open(os.path.join(git_dir, 'commondir'), 'r', encoding='utf-8') as f:
+        common_dir = f.readline().rstrip('\n')
+      if common_dir != '':
+        pathnames.append(os.path.join(git_dir, common_dir, 'config'))
+    except (OSError, UnicodeDecodeError):
+      pass
+  return pathnames
+
+def _git_config_stamp(pathnames: List[str]) -> _GitConfigStamp:
+  """Returns the pathnames and inode numbers, sizes and modification times of a list of git config files.
+
+  Included in the cache keys of git config lookups so that cached values are
+  discarded when any config file is created, modified or removed. git replaces
+  config files by renaming a new file over them, so the inode number catches
+  rewrites that land within the filesystem's timestamp granularity.
+  """
+  stamp: List[Tuple[str, Optional[Tuple[int, int, int]]]] = []
+  for pathname in pathnames:
+    try:
+      st = os.stat(pathname)
+      signature: Optional[Tuple[int, int, int]] = (st.st_ino, st.st_size, st.st_mtime_ns)
+    except OSError:
+      signature = None
+    stamp.append((pathname, signature))
+  return tuple(stamp)
+
+_git_config_name_re = re.compile(r'([A-Za-z0-9\-]+)(?:\.([^\n]*))?\.([A-Za-z][A-Za-z0-9\-]*)\Z')
+
+def _canonical_git_config_name(name: str) -> Optional[str]:
+  """Returns a git config variable name with its section and key lowercased, as git compares them,
+     or None if the name is not valid."""
+  m = _git_config_name_re.match(name)
+  if m is None:
+    return None
+  section, subsection, key = m.groups()
+  if subsection is None:
+    return f"{section.lower()}.{key.lower()}"
+  return f"{section.lower()}.{subsection}.{key.lower()}"
+
+@lru_cache(maxsize=32)
+def _get_git_config_listing(
+      cwd: str,
+      stamp: _GitConfigStamp,
+      env: Tuple[Tuple[str, str], ...],
+    ) -> Dict[str, str]:
+  """Returns all git config values that apply to cwd, from a single git invocation.
+     cwd must be canonicalized. stamp and env are only used as part of the cache key."""
+  output = sudo_check_output_stderr_exception(
+      ['git', '-C', cwd, 'config', '--list', '--null'],
+      use_sudo=False,
+    ).decode('utf-8')
+  result: Dict[str, str] = {}
+  for entry in output.split('\0'):
+    if entry != '':
+      # a variable with no value is listed without a newline; "git config <name>" prints it as empty
+      key, _, value = entry.partition('\n')
+      # values have always been returned with trailing whitespace stripped
+      result[key] = value.rstrip()
+  return result
+
+def _get_git_config(cwd: str) -> Dict[str, str]:
+  """Returns all git config values that apply to cwd, keyed by canonical name. cwd must be canonicalized.
+
+  git is run once to list every value; the result is cached until a config file or a
+  GIT_* environment variable changes.
+  """
+  stamp = _git_config_stamp(_git_config_pathnames(cwd))
+  env = tuple(sorted((k, v) for k, v in os.environ.items() if k.startswith('GIT_')))
+  return _get_git_config_listing(cwd, stamp, env)
+
 def get_optional_git_config_value(name: str, cwd: Optional[str]=None) -> Optional[str]:
-  """Gets a configuration value from the local git installation"""
+  """Gets a configuration value from the local git installation
+
+  All config values for a directory are read at once with a single "git config --list".
+  They are cached and discarded when a git config file is modified; see clear_git_cache().
+  """
   if cwd is None:
     cwd = '.'
-  try:
-    result = sudo_check_output_stderr_exception(
-        ['git', '-C', cwd, 'config', name],
-        use_sudo=False,
-      ).decode('utf-8').rstrip()
-  except CalledProcessErrorWithStderrMessage as e:
-    if e.returncode == 1 and (e.stderr is None or len(e.stderr) == 0):
-      result = None
-    else:
-      raise
-  return result
+  cwd = os.path.realpath(cwd)
+  canonical_name = _canonical_git_config_name(name)
+  if canonical_name is None:
+    # Not a valid variable name; let git report the error
+    try:
+      result: Optional[str] = sudo_check_output_stderr_exception(
+          ['git', '-C', cwd, 'config', name],
+          use_sudo=False,
+        ).decode('utf-8').rstrip()
+    except CalledProcessErrorWithStderrMessage as e:
+      if e.returncode == 1 and (e.stderr is None or len(e.stderr) == 0):
+        result = None
+      else:
+        raise
+    return result
+  return _get_git_config(cwd).get(canonical_name)
 
 def set_git_config_value(name: str, value: str, cwd: Optional[str]=None, is_global: bool=False) -> None:
   """Sets a configuration value in the local git installation"""
@@ -287,10 +535,13 @@ def set_git_config_value(name: str, value: str, cwd: Optional[str]=None, is_glob
     cmd.append('--global')
   cmd.extend([name, value])
 
-  sudo_check_output_stderr_exception(
-        cmd,
-        use_sudo=False,
-      )
+  try:
+    sudo_check_output_stderr_exception(
+          cmd,
+          use_sudo=False,
+        )
+  finally:
+    clear_git_cache()
 
 def get_git_config_value(name: str, cwd: Optional[str]=None) -> str:
   """Gets a configuration value from the local git installation"""
@@ -299,13 +550,21 @@ def get_git_config_value(name: str, cwd: Optional[str]=None) -> str:
     raise KeyError(f"git config value '{name}' does not exist")
   return result
 
+def _get_git_user_config_value(name: str, cwd: Optional[str]=None) -> str:
+  if cwd is None:
+    cwd = '.'
+  result = _get_git_config(os.path.realpath(cwd)).get(name)
+  if result is None:
+    raise KeyError(f"git config value '{name}' does not exist")
+  return result
+
 def get_git_user_email(cwd: Optional[str]=None) -> str:
   """Gets the user email address associated with the local git installation"""
-  return get_git_config_value('user.email', cwd=cwd)
+  return _get_git_user_config_value('user.email', cwd=cwd)
 
 def get_git_user_friendly_name(cwd: Optional[str]=None) -> str:
   """Gets the friendly name associated with the local git installation"""
-  return get_git_config_value('user.name', cwd=cwd)
+  return _get_git_user_config_value('user.name', cwd=cwd)
 
 def set_git_user_email(value: str, cwd: Optional[str]=None, is_global: bool=True) -> None:
   """Sets the user email address associated with the local git installation"""
@@ -315,9 +574,25 @@ def set_git_user_friendly_name(value: str, cwd: Optional[str]=None, is_global: b
   """Sets the friendly name associated with the local git installation"""
   set_git_config_value('user.name', value, cwd=cwd, is_global=is_global)
 
+@lru_cache(maxsize=128)
+def _get_git_root_dir_cached(starting_dir: str) -> Optional[str]:
+  """Cached implementation of get_git_root_dir. starting_dir must be absolute."""
+  rel_root_dir: Optional[str] = None
+  try:
+    rel_root_dir = subprocess.check_output(
+        ['git', '-C', starting_dir, 'rev-parse', '--show-cdup'],
+        stderr=subprocess.DEVNULL,
+      ).decode('utf-8').rstrip()
+  except subprocess.CalledProcessError:
+    pass
+  result = None if rel_root_dir is None else os.path.abspath(os.path.join(starting_dir, rel_root_dir))
+  return result
+
 def get_git_root_dir(starting_dir: Optional[str]=None) -> Optional[str]:
   """Find the root directory of the current git project
 
+  Results (including None) are cached per starting directory; see clear_git_cache().
+
   Args:
       starting_dir (str, optional): The subdir in which to begin the search.
                       If None, "." is used. Defaults to None.
@@ -328,17 +603,18 @@ def get_git_root_dir(starting_dir: Optional[str]=None) -> Optional[str]:
   """
   if starting_dir is None:
     starting_dir = '.'
-  starting_dir = os.path.abspath(starting_dir)
-  rel_root_dir: Optional[str] = None
-  try:
-    rel_root_dir = subprocess.check_output(
-        ['git', '-C', starting_dir, 'rev-parse', '--show-cdup'],
-        stderr=subprocess.DEVNULL,
-      ).decode('utf-8').rstrip()
-  except subprocess.CalledProcessError:
-    pass
-  result = None if rel_root_dir is None else os.path.abspath(os.path.join(starting_dir, rel_root_dir))
-  return result
+  return _get_git_root_dir_cached(os.path.abspath(starting_dir))
+
+def clear_git_cache() -> None:
+  """Discards cached results of git config and git root directory lookups.
+
+  Called automatically by set_git_config_value(). Cached config values are also
+  discarded when a git config file changes, but changes to files pulled in with
+  include.path or includeIf are not detected, and long-running processes that
+  create or move git repositories by other means should call this explicitly.
+  """
+  _get_git_config_listing.cache_clear()
+  _get_git_root_dir_cached.cache_clear()
 
 def append_lines_to_file_if_missing(
     pathname: str,
@@ -372,25 +648,32 @@ def append_lines_to_file_if_missing(
   if not isinstance(lines, list):
     lines = [lines]
 
-  if create_file and not os.path.exists(pathname):
-    with open(os.open(
-          pathname, os.O_CREAT | os.O_WRONLY, create_mode
-        ), 'w', encoding='utf-8'):
-      pass
-    result = True
+  if create_file:
+    # Create and open in a single step; O_EXCL tells us whether the file was created
+    try:
+      fd = os.open(pathname, os.O_CREAT | os.O_EXCL | os.O_RDWR, create_mode)
+      result = True
+    except FileExistsError:
+      fd = os.open(pathname, os.O_RDWR)
+  elif len(lines) > 0:
+    fd = os.open(pathname, os.O_RDWR)
+  else:
+    return result
 
-  if len(lines) > 0:
-    adjusted = [x.rstrip("\n\r") for x in lines]
-    found = dict((x, False) for x in adjusted)
-    with open(pathname, "r+", encoding='utf-8') as f:
+  with open(fd, "r+", encoding='utf-8') as f:
+    if len(lines) > 0:
+      # ordered, with duplicates removed
+      adjusted = list(dict.fromkeys(x.rstrip("\n\r") for x in lines))
+      needed = set(adjusted)
       ends_with_newline: bool = True
       for line in f:
         ends_with_newline = line.endswith("\n")
-        bline = line.rstrip("\n\r")
-        if bline in found:
-          found[bline] = True
+        needed.discard(line.rstrip("\n\r"))
+        if len(needed) == 0:
+          # nothing will be written, so there is no need to read further
+          break
       for line in adjusted:
-        if not found[line]:
+        if line in needed:
           if not ends_with_newline:
             f.write("\n")
             ends_with_newline = True
@@ -417,14 +700,12 @@ def multiline_indent(
   """
   if n <= 0 or s == '':
     return s
+  prefix = ' '*n
   lines = s.split('\n')
-  result: List[str] = []
-  for line in lines:
-    if line != '':
-      line = ' '*n + line
-      if trim:
-        line = line.rstrip()
-    result.append(line)
+  if trim:
+    result = [ (prefix + line).rstrip() if line != '' else line for line in lines ]
+  else:
+    result = [ prefix + line if line != '' else line for line in lines ]
   return '\n'.join(result)
 
 def _detab(s: str, tab_width: int=4, ip: int=0) -> str:
@@ -442,11 +723,17 @@ def _detab(s: str, tab_width: int=4, ip: int=0) -> str:
   Returns:
       str: The same string with all tabs converted to spaces.
   """
-  result = ""
+  parts: List[str] = []
   next_tab: int = s.find('\t')
   if next_tab < 0:
     # string has no tabs
     return s
+  if not '\r' in s:
+    # str.expandtabs() has identical semantics except that it also resets the
+    # column at '\r', so it can only be used if there are none.
+    if ip == 0:
+      return s.expandtabs(tab_width)
+    return (' '*ip + s).expandtabs(tab_width)[ip:]
   # find the first newline, if any. We have to find
   # all newlines up to the last tab, to reset the
   # character column number.
@@ -456,7 +743,7 @@ def _detab(s: str, tab_width: int=4, ip: int=0) -> str:
     if 0 <= next_newline  < next_tab:
       # There are more tabs, but a newline appears before the next tab
       assert next_newline >= ic
-      result += s[ic:next_newline+1]   # take all chars up to the next newline
+      parts.append(s[ic:next_newline+1])   # take all chars up to the next newline
       ic = next_newline+1
       ip = 0  # reset the column number to 0--start of a new line
       # Find the next newline, if any
@@ -464,13 +751,13 @@ def _detab(s: str, tab_width: int=4, ip: int=0) -> str:
     else:
       # there is a tab before the next newline
       assert next_tab >= ic
-      result += s[ic:next_tab]  # take all chars up to the tab
+      parts.append(s[ic:next_tab])  # take all chars up to the tab
       ip += next_tab - ic
 
       ns = tab_width - (ip % tab_width)  # compute number of spaces modulo tab with
 
       # append the correct number of spaces
-      result += ' '*ns
+      parts.append(' '*ns)
       ip += ns
       ic = next_tab+1
 
@@ -479,9 +766,13 @@ def _detab(s: str, tab_width: int=4, ip: int=0) -> str:
 
       # if there are no more tabs, append the remainder of the string and exit
       if next_tab < 0:
-        result += s[ic:]
+        parts.append(s[ic:])
         break
-  return result
+  return ''.join(parts)
+
+_trailing_whitespace_re = re.compile(r'[^\S\n]+$', re.MULTILINE)
+_leading_whitespace_re = re.compile(r'^[^\S\n]*(?=\S)', re.MULTILINE)
+_any_leading_whitespace_re = re.compile(r'^[^\S\n]+', re.MULTILINE)
 
 def dedent(
       s: str,
@@ -523,44 +814,36 @@ def dedent(
     return s
   s = _detab(s, tab_width=tab_width)
 
-  lines = s.split('\n')
-  if strip_empty_first_line and (lines[0] == '' or strip_trailing_whitespace and lines[0].rstrip() == ''):
-    lines = lines[1:]
-    ignore_first_line = False
-
-  if len(lines) == 0:
-    return ''
-
-  min_existing_indent: Optional[int] = None
-  bare_lines: List[Tuple[Optional[int], str]] = []
-  for i, line in enumerate(lines):
-    rstrip_line = line.rstrip()
-    is_whitespace_line = rstrip_line == ''
-    if strip_trailing_whitespace:
-      line = rstrip_line
-    line_tail = line if is_whitespace_line else line.lstrip()
-    existing_indent = None if is_whitespace_line else len(line)-len(line_tail)
-    if not existing_indent is None and (i > 0 or not ignore_first_line) and (
-          min_existing_indent is None or existing_indent < min_existing_indent):
-      min_existing_indent = existing_indent
-    bare_lines.append((existing_indent, line_tail))
-  if min_existing_indent is None:
-    min_existing_indent = 0
-
-  for i, bare_line in enumerate(bare_lines):
-    existing_indent, line = bare_line
-    if line != '':
-      if existing_indent is None:
-        existing_indent = len(line)
-      ns = max(0, existing_indent - min_existing_indent)
-      line = ' '*ns + line
-      lines[i] = line
-    lines[i] = line
-
-  if force_end_with_newline and lines[-1] != '':
-    lines.append('')
-
-  return '\n'.join(lines)
+  if strip_empty_first_line:
+    first_line, sep, rest = s.partition('\n')
+    if first_line == '' or strip_trailing_whitespace and first_line.rstrip() == '':
+      if sep == '':
+        return ''
+      s = rest
+      ignore_first_line = False
+
+  if strip_trailing_whitespace:
+    s = _trailing_whitespace_re.sub('', s)
+
+  # Leading whitespace of lines that are not whitespace-only
+  indents = [ m.end() - m.start() for m in _leading_whitespace_re.finditer(s)
+                  if not ignore_first_line or m.start() > 0 ]
+  min_existing_indent = min(indents, default=0)
+
+  def _reindent(m: re.Match) -> str:
+    existing_indent = m.end() - m.start()
+    result = ' '*max(0, existing_indent - min_existing_indent)
+    if m.end() == len(s) or s[m.end()] == '\n':
+      # whitespace-only line; existing whitespace is retained
+      result += m.group()
+    return result
+
+  s = _any_leading_whitespace_re.sub(_reindent, s)
+
+  if force_end_with_newline and s != '' and not s.endswith('\n'):
+    s += '\n'
+
+  return s
 
 def gen_etc_shadow_password_salt(num_chars: int=16) -> str:
   # linux mkpasswd only accepts salt with chars in [a-zA-Z0-9/.].
@@ -575,11 +858,12 @@ def gen_etc_shadow_password_salt(num_chars: int=16) -> str:
   salt = secrets.token_urlsafe(num_chars)[:num_chars].replace('-', '/').replace('_', '.')
   return salt
 
-_valid_shadow_password_chars = set(string.ascii_lowercase + string.ascii_uppercase + string.digits + '/.')
+# str.translate() table that deletes every valid salt character; anything left over is invalid
+_delete_valid_shadow_password_chars = str.maketrans('', '', string.ascii_lowercase + string.ascii_uppercase + string.digits + '/.')
 def is_valid_etc_shadow_password_salt(salt: str) -> bool:
   # linux mkpasswd only accepts salt with chars in [a-zA-Z0-9/.],
   # and the salt must be 8-12 chars in length
-  return 8 <= len(salt) <= 16 and all(c in _valid_shadow_password_chars for c in salt)
+  return 8 <= len(salt) <= 16 and salt.translate(_delete_valid_shadow_password_chars) == ''
 
 def gen_etc_shadow_password_hash(password: str, salt: Optional[str]=None, num_chars: int=16) -> str:
   """Generates a unique, salted SHA512 password hash for /etc/shadow.
@@ -605,8 +889,21 @@ def gen_etc_shadow_password_hash(password: str, salt: Optional[str]=None, num_ch
   if not is_valid_etc_shadow_password_salt(salt):
     raise ValueError(f"Invalid /etc/shadow password salt string: '{salt}'")
 
-  # use openssl rather than mkpasswd because the latter is not installed in base os
-  result = subprocess.check_output(['openssl', 'passwd', '-6', '-salt', salt, password]).decode('utf-8').rstrip()
+  result: Optional[str] = None
+  if not _crypt is None:
+    # In-process crypt(3); "$6$" selects SHA-512, identical to "openssl passwd -6"
+    result = _crypt.crypt(password, f"$6${salt}")
+  if result is None:
+    # use openssl rather than mkpasswd because the latter is not installed in base os
+    if '\n' in password:
+      # -stdin reads one password per line, so this one can only be passed on the commandline
+      result = subprocess.check_output(['openssl', 'passwd', '-6', '-salt', salt, password]).decode('utf-8').rstrip()
+    else:
+      # pass the password on stdin so it is not visible in the process list
+      result = subprocess.check_output(
+          ['openssl', 'passwd', '-6', '-salt', salt, '-stdin'],
+          input=(password + '\n').encode('utf-8')
+        ).decode('utf-8').rstrip()
   return result
 
 def atomic_mv(source: str, dest: str) -> None:
@@ -614,16 +911,27 @@ def atomic_mv(source: str, dest: str) -> None:
   Equivalent to the linux "mv" commandline.  Atomic within same volume, and overwrites the destination.
   Works for directories.
 
+  Implemented in-process with os.replace(); falls back to shutil.move() if source and
+  dest are on different volumes.
+
   Args:
       source (str): Source file or directory.x
       dest (str): Destination file or directory. Will be overwritten if it exists.
+                  If dest is an existing directory, source is moved into it, as with "mv".
 
   Raises:
-      RuntimeError: Any error from the mv command
+      OSError: The move failed
   """
-  source = os.path.expanduser(source)
-  dest = os.path.expanduser(dest)
-  subprocess.check_call(['mv', source, dest])
+  source = _expanduser(source)
+  dest = _expanduser(dest)
+  if os.path.isdir(dest):
+    dest = os.path.join(dest, os.path.basename(source.rstrip(os.sep)))
+  try:
+    os.replace(source, dest)
+  except OSError as e:
+    if e.errno != errno.EXDEV:
+      raise
+    shutil.move(source, dest)
 
 def deactivate_virtualenv(env: Optional[MutableMapping]=None):
   """Modifies env vars to deactivate any activated virtualenv.
@@ -637,21 +945,22 @@ def deactivate_virtualenv(env: Optional[MutableMapping]=None):
   """
   if env is None:
     env = os.environ
-  if 'VIRTUAL_ENV' in env:
-    venv = env['VIRTUAL_ENV']
-    del env['VIRTUAL_ENV']
-    if 'POETRY_ACTIVE' in env:
-      del env['POETRY_ACTIVE']
-    if 'PATH' in env:
-      venv_bin = os.path.join(venv, 'bin')
-      env['PATH'] = searchpath_remove_dir(env['PATH'], venv_bin)
-
-def get_aws_session(s: Optional[BotoAwsSession]=None) -> BotoAwsSession:
+  venv = env.pop('VIRTUAL_ENV', None)
+  if venv is None:
+    return
+  env.pop('POETRY_ACTIVE', None)
+  path = env.get('PATH')
+  if not path is None:
+    venv_bin = os.path.join(venv, 'bin')
+    env['PATH'] = searchpath_remove_dir(path, venv_bin)
+
+def get_aws_session(s: Optional['BotoAwsSession']=None) -> 'BotoAwsSession':
   if s is None:
+    from boto3.session import Session as BotoAwsSession  # pylint: disable=import-outside-toplevel,redefined-outer-name
     s = BotoAwsSession()
   return s
 
-def get_aws_identity(s: Optional[BotoAwsSession]=None) -> Dict[str, str]:
+def get_aws_identity(s: Optional['BotoAwsSession']=None) -> Dict[str, str]:
   """Fetches AWS identity including the account number associated with an AWS session.
 
   The first time it is done for a session, requires a network request to AWS.
@@ -678,7 +987,7 @@ def get_aws_identity(s: Optional[BotoAwsSession]=None) -> Dict[str, str]:
     s._xpulumi_caller_identity = result  # type: ignore[attr-defined] # pylint: disable=protected-access
   return result
 
-def get_aws_account(s: Optional[BotoAwsSession]=None) -> str:
+def get_aws_account(s: Optional['BotoAwsSession']=None) -> str:
   """Fetches the AWS account number associated with an AWS session.
 
   Args:
@@ -687,7 +996,7 @@ def get_aws_account(s: Optional[BotoAwsSession]=None) -> str:
   """
   return get_aws_identity(s)['Account']
 
-def get_aws_region(s: Optional[BotoAwsSession]=None, default: Optional[str]=None) -> Optional[str]:
+def get_aws_region(s: Optional['BotoAwsSession']=None, default: Optional[str]=None) -> Optional[str]:
   """Fetches the AWS region associated with an AWS session.
 
   Args:
@@ -846,6 +1155,11 @@ class SysPackageVersion(NamedTuple):
   def __le__(self, other: Self) -> bool:
     return self.compare(other) <= 0
 
+@lru_cache(maxsize=256)
+def _parse_sys_package_version(version_str: str) -> SysPackageVersion:
+  """Cached SysPackageVersion.parse(); the result is immutable, so it can be shared."""
+  return SysPackageVersion.parse(version_str)
+
 def check_version_ge(version1: str, version2: str) -> bool:
   """returns True iff version1 is greater than or equal to version2
 
@@ -856,7 +1170,7 @@ def check_version_ge(version1: str, version2: str) -> bool:
   Returns:
       bool: True iff version1 is greater than or equal to version2
   """
-  return SysPackageVersion.parse(version1) >= SysPackageVersion.parse(version2)
+  return _parse_sys_package_version(version1) >= _parse_sys_package_version(version2)
 
 def searchpath_split(searchpath: Optional[str]=None) -> List[str]:
   """Splits a ':'-delimited search path string into a list of directories
@@ -872,7 +1186,7 @@ def searchpath_split(searchpath: Optional[str]=None) -> List[str]:
   """
   if searchpath is None:
     searchpath = os.environ['PATH']
-  result = [ x for x in searchpath.split(os.pathsep) if x != '' ]
+  result = list(filter(None, searchpath.split(os.pathsep)))
   return result
 
 def searchpath_join(dirnames: List[str]) -> str:
@@ -906,7 +1220,7 @@ def searchpath_parts_contains_dir(parts: List[str], dirname: str) -> bool:
   Returns:
       bool: True if the directory name after normalization is in the list of directories
   """
-  dirname = os.path.abspath(os.path.normpath(os.path.expanduser(dirname)))
+  dirname = abspath_expanduser(dirname)
   return dirname in parts
 
 def searchpath_contains_dir(searchpath: Optional[str], dirname: str) -> bool:
@@ -924,7 +1238,10 @@ def searchpath_contains_dir(searchpath: Optional[str], dirname: str) -> bool:
   Returns:
       bool: True if the directory name after normalization is in the list of directories
   """
-  return searchpath_parts_contains_dir(searchpath_split(searchpath), dirname)
+  if searchpath is None:
+    searchpath = os.environ['PATH']
+  # The normalized dirname is never empty, so empty entries need not be filtered out
+  return abspath_expanduser(dirname) in searchpath.split(os.pathsep)
 
 def searchpath_parts_remove_dir(parts: List[str], dirname: str) -> List[str]:
   """Removes a directory name from a list of directories.
@@ -944,7 +1261,7 @@ def searchpath_parts_remove_dir(parts: List[str], dirname: str) -> List[str]:
       List[str]: A list of directory names, with the specified directory removed
                  if it was present in the original list.
   """
-  dirname = os.path.abspath(os.path.normpath(os.path.expanduser(dirname)))
+  dirname = abspath_expanduser(dirname)
   result = [ x for x in parts if x != dirname ]
   return result
 
@@ -970,7 +1287,11 @@ def searchpath_remove_dir(searchpath: Optional[str], dirname: str) -> str:
                  if it was present in the original list. Extraneous ':' delimeters
                  are removed.
   """
-  return searchpath_join(searchpath_parts_remove_dir(searchpath_split(searchpath), dirname))
+  if searchpath is None:
+    searchpath = os.environ['PATH']
+  dirname = abspath_expanduser(dirname)
+  # split, filter and join in a single pass
+  return os.pathsep.join(x for x in searchpath.split(os.pathsep) if x not in ('', dirname))
 
 def searchpath_parts_prepend(parts: List[str], dirname: str) -> List[str]:
   """Prepends a directory name to a list of directories.
@@ -993,8 +1314,9 @@ def searchpath_parts_prepend(parts: List[str], dirname: str) -> List[str]:
       List[str]: A list of directory names, with the normalized directory name appearing
                  exactly once at the beginning of the list.
   """
-  dirname = os.path.abspath(os.path.normpath(os.path.expanduser(dirname)))
-  result = [dirname] + searchpath_parts_remove_dir(parts, dirname)
+  dirname = abspath_expanduser(dirname)
+  result = [dirname]
+  result.extend(x for x in parts if x != dirname)
   return result
 
 def searchpath_prepend(searchpath: Optional[str], dirname: str) -> str:
@@ -1038,7 +1360,7 @@ def searchpath_parts_prepend_if_missing(parts: List[str], dirname: str) -> List[
       List[str]: A list of directory names, with the normalized directory name appearing
                  at least once, and at the beginning of the list if it was added.
   """
-  dirname = os.path.abspath(os.path.normpath(os.path.expanduser(dirname)))
+  dirname = abspath_expanduser(dirname)
   if dirname in parts:
     result = parts[:]
   else:
@@ -1066,6 +1388,49 @@ def searchpath_prepend_if_missing(searchpath: Optional[str], dirname: str) -> st
   """
   return searchpath_join(searchpath_parts_prepend_if_missing(searchpath_split(searchpath), dirname))
 
+def searchpath_parts_prepend_many_if_missing(parts: List[str], dirnames: List[str]) -> List[str]:
+  """Prepends directory names to a list of directories, skipping any that are already present.
+
+  The directories already present are collected into a set once, rather than the list
+  being scanned for every directory name. The names that are added are placed at
+  the beginning of the list in the order given, so the first of them will be searched
+  first (unlike repeated calls to searchpath_parts_prepend_if_missing(), which would
+  leave the last one added at the front).
+
+  Args:
+      parts (List[str]): A list of directory names, normalized to absolute paths
+      dirnames (List[str]): Directory names, which will be normalized to absolute paths
+
+  Returns:
+      List[str]: A new list of directory names, with each normalized directory name appearing
+                 at least once. Names that were added appear at the beginning, in the order given.
+  """
+  present = set(parts)
+  result: List[str] = []
+  for dirname in dirnames:
+    dirname = abspath_expanduser(dirname)
+    if not dirname in present:
+      present.add(dirname)
+      result.append(dirname)
+  result.extend(parts)
+  return result
+
+def searchpath_prepend_many_if_missing(searchpath: Optional[str], dirnames: List[str]) -> str:
+  """Prepends directory names to a ':'-delimited search path, skipping any that are already present.
+
+  The search path is only split and joined once.
+
+  Args:
+      searchpath (str): A ':'-delimited search path string, or None
+                        to use os.environ['PATH'].
+      dirnames (List[str]): Directory names, which will be normalized to absolute paths
+
+  Returns:
+      str: The resulting search path, with each normalized directory name appearing
+           at least once. Names that were added appear at the beginning, in the order given.
+  """
+  return searchpath_join(searchpath_parts_prepend_many_if_missing(searchpath_split(searchpath), dirnames))
+
 def searchpath_parts_force_append(parts: List[str], dirname: str) -> List[str]:
   """Appends a directory name to a list of directories or forces it to the end if it is already in the list.
 
@@ -1086,8 +1451,9 @@ def searchpath_parts_force_append(parts: List[str], dirname: str) -> List[str]:
       List[str]: A list of directory names, with the normalized directory name appearing
                  exactly once at the end of the list.
   """
-  dirname = os.path.abspath(os.path.normpath(os.path.expanduser(dirname)))
-  result = searchpath_parts_remove_dir(parts, dirname) + [dirname]
+  dirname = abspath_expanduser(dirname)
+  result = [ x for x in parts if x != dirname ]
+  result.append(dirname)
   return result
 
 def searchpath_force_append(searchpath: Optional[str], dirname: str) -> str:
@@ -1135,7 +1501,7 @@ def searchpath_parts_append(parts: List[str], dirname: str) -> List[str]:
       List[str]: A list of directory names, with the normalized directory name appearing
                  at least once, and at the end of the list if added.
   """
-  dirname = os.path.abspath(os.path.normpath(os.path.expanduser(dirname)))
+  dirname = abspath_expanduser(dirname)
   if dirname in parts:
     result = parts[:]
   else:
@@ -1166,48 +1532,165 @@ def searchpath_append(searchpath: Optional[str], dirname: str) -> str:
   """
   return searchpath_join(searchpath_parts_append(searchpath_split(searchpath), dirname))
 
+def searchpath_parts_append_many(parts: List[str], dirnames: List[str]) -> List[str]:
+  """Appends directory names to a list of directories, skipping any that are already present.
+
+  Equivalent to calling searchpath_parts_append() for each directory name in turn, but
+  the directories already present are collected into a set once, rather than the list
+  being scanned for every directory name.
+
+  Args:
+      parts (List[str]): A list of directory names, normalized to absolute paths
+      dirnames (List[str]): Directory names, which will be normalized to absolute paths
+
+  Returns:
+      List[str]: A new list of directory names, with each normalized directory name appearing
+                 at least once. Names that were added appear at the end, in the order given.
+  """
+  present = set(parts)
+  result = parts[:]
+  for dirname in dirnames:
+    dirname = abspath_expanduser(dirname)
+    if not dirname in present:
+      present.add(dirname)
+      result.append(dirname)
+  return result
+
+def searchpath_append_many(searchpath: Optional[str], dirnames: List[str]) -> str:
+  """Appends directory names to a ':'-delimited search path, skipping any that are already present.
+
+  Equivalent to calling searchpath_append() for each directory name in turn, but the
+  search path is only split and joined once.
+
+  Args:
+      searchpath (str): A ':'-delimited search path string, or None
+                        to use os.environ['PATH'].
+      dirnames (List[str]): Directory names, which will be normalized to absolute paths
+
+  Returns:
+      str: The resulting search path, with each normalized directory name appearing
+           at least once. Names that were added appear at the end, in the order given.
+  """
+  return searchpath_join(searchpath_parts_append_many(searchpath_split(searchpath), dirnames))
+
+@run_once
 def get_current_architecture() -> str:
   """Returns current hardware architecture; e.g., aarch64 or x86_64"""
   return platform.machine()
 
+@run_once
 def get_current_system() -> str:
   """Returns current software platform; e.g., Linux or Darwin"""
   return platform.system()
 
+@lru_cache(maxsize=256)
+def _get_group_info_by_name(group: str) -> Optional[grp.struct_group]:
+  """Cached grp.getgrnam(); returns None if the group does not exist, so misses are cached too"""
+  try:
+    return grp.getgrnam(group)
+  except KeyError:
+    return None
+
+@lru_cache(maxsize=256)
+def _get_group_info_by_gid(gid: int) -> Optional[grp.struct_group]:
+  """Cached grp.getgrgid(); returns None if the GID does not exist, so misses are cached too"""
+  try:
+    return grp.getgrgid(gid)
+  except KeyError:
+    return None
+
+@lru_cache(maxsize=1)
+def _get_all_group_info() -> Tuple[grp.struct_group, ...]:
+  """Cached grp.getgrall(), so that probing several groups enumerates the group database once"""
+  return tuple(grp.getgrall())
+
+def clear_os_group_cache() -> None:
+  """Discards cached OS group lookups.
+
+  Called automatically after os_packages creates or modifies groups, and after it installs,
+  upgrades, or removes OS packages, whose maintainer scripts may create groups. Long-running
+  processes that modify OS groups by other means should call this explicitly.
+  """
+  _get_group_info_by_name.cache_clear()
+  _get_group_info_by_gid.cache_clear()
+  _get_all_group_info.cache_clear()
+  _get_os_groups_of_user.cache_clear()
+  _get_os_group_set_of_user.cache_clear()
+
 def get_gid_of_group(group: str) -> int:
   """Returns the GID of a group name"""
-  gi = grp.getgrnam(group)
+  gi = _get_group_info_by_name(group)
+  if gi is None:
+    raise KeyError(f"getgrnam(): name not found: {group!r}")
   return gi.gr_gid
 
 def get_group_of_gid(gid: int) -> str:
   """Returns the name of a group given its GID"""
-  gi = grp.getgrgid(gid)
+  gi = _get_group_info_by_gid(gid)
+  if gi is None:
+    raise KeyError(f"getgrgid(): gid not found: {gid}")
   return gi.gr_name
 
 def gid_exists(gid: int) -> bool:
   """Returns True if a group with the specified GID exists"""
-  result = False
-  try:
-    get_group_of_gid(gid)
-    result = True
-  except KeyError:
-    pass
-  return result
+  return not _get_group_info_by_gid(gid) is None
 
 def get_file_hash_hex(filename: str) -> str:
   """Returns the SHA256 hash of a file as a hex string"""
-  h = hashlib.sha256()
-  with open(filename, 'rb') as f:
-    while True:
-      data = f.read(1024*128)
-      if len(data) == 0:
-        break
-      h.update(data)
-  return h.hexdigest()
+  # unbuffered, so data is not copied through an io buffer before hashing
+  with open(filename, 'rb', buffering=0) as f:
+    return hashlib.file_digest(f, 'sha256').hexdigest()
+
+_files_compare_chunk_size = 4 * 1024 * 1024
 
 def files_are_identical(filename1: str, filename2: str, quick: bool=False) -> bool:
-  """Returns True if two files are identical"""
-  return filecmp.cmp(filename1, filename2, shallow=quick)
+  """Returns True if two files are identical
+
+  If quick is True, files with the same type, size and modification time
+  are assumed to be identical without comparing their contents.
+  """
+  if quick:
+    return filecmp.cmp(filename1, filename2, shallow=True)
+  st1 = os.stat(filename1)
+  st2 = os.stat(filename2)
+  if not stat.S_ISREG(st1.st_mode) or not stat.S_ISREG(st2.st_mode) or st1.st_size != st2.st_size:
+    # filecmp only considers regular files to be identical
+    return False
+  if st1.st_size == 0 or os.path.samestat(st1, st2):
+    return True
+  with open(filename1, 'rb') as f1, open(filename2, 'rb') as f2:
+    with mmap.mmap(f1.fileno(), 0, access=mmap.ACCESS_READ) as m1, \
+         mmap.mmap(f2.fileno(), 0, access=mmap.ACCESS_READ) as m2:
+      # compare in bounded chunks; bytes equality is a single memcmp
+      if len(m1) != len(m2):
+        # file changed size since stat
+        return False
+      for offset in range(0, len(m1), _files_compare_chunk_size):
+        end = offset + _files_compare_chunk_size
+        if m1[offset:end] != m2[offset:end]:
+          return False
+  return True
+
+@run_once
+def get_default_pool_manager() -> urllib3.PoolManager:
+  """Returns a process-wide urllib3 PoolManager, used by the download_url_* functions
+     when no pool_manager is provided.
+
+  Sharing one PoolManager lets successive downloads from the same host reuse
+  keep-alive connections instead of paying for a new TCP/TLS handshake each time.
+
+  Idempotent requests are retried with a short backoff on connection errors and
+  on transient server errors (500, 502, 503, 504). If the server keeps failing, the
+  final response is returned rather than raising, as it would be without retries.
+  """
+  retries = urllib3.Retry(
+      total=5,
+      backoff_factor=0.2,
+      status_forcelist=(500, 502, 503, 504),
+      allowed_methods=frozenset(['GET', 'HEAD']),
+      raise_on_status=False,
+    )
+  return urllib3.PoolManager(num_pools=32, maxsize=16, block=False, retries=retries)
 
 def download_url_text(
       url: str,
@@ -1215,7 +1698,7 @@ def download_url_text(
     ) -> str:
   """Returns the content of a text document at an URL as a string"""
   if pool_manager is None:
-    pool_manager = urllib3.PoolManager()
+    pool_manager = get_default_pool_manager()
   resp = cast(urllib3.HTTPResponse, pool_manager.request('GET', url, preload_content=False))
   return resp.data.decode('utf-8')
 
@@ -1225,7 +1708,7 @@ def download_url_bytes(
     ) -> bytes:
   """Returns the content of a binary document at an URL as a bytes object"""
   if pool_manager is None:
-    pool_manager = urllib3.PoolManager()
+    pool_manager = get_default_pool_manager()
   resp = cast(urllib3.HTTPResponse, pool_manager.request('GET', url, preload_content=False))
   return resp.data
 
@@ -1237,7 +1720,9 @@ def download_url_file(
       mode: Optional[int] = None,
       uid: Optional[int] = None,
       gid: Optional[int] = None,
-    ) -> None:
+      *,
+      if_modified_since: Optional[float] = None,
+    ) -> bool:
   """Downloads a file from an URL to a local file.
 
   sudo is not used; the file is written with the current user's permissions.
@@ -1247,7 +1732,7 @@ def download_url_file(
       filename (str): The local filename to download to
       pool_manager (Optional[urllib3.PoolManager], optional):
               An optional urllib3 PoolManager to use for the download.
-              Defaults to None, in which case a default PoolManager is used.
+              Defaults to None, in which case get_default_pool_manager() is used.
       filter_cmd (Optional[Union[str, List[str]]], optional):
               An optional command to pipe the downloaded file through before
               writing it to disk. Defaults to None, in which case the file is
@@ -1261,13 +1746,27 @@ def download_url_file(
       gid (Optional[int], optional):
               Optional group ID (see chown) to use when creating the local file. Defaults to None,
               in which case the default group ID is used.
+      if_modified_since (Optional[float], optional):
+              Optional POSIX timestamp; e.g., the st_mtime of a previously downloaded copy. If provided
+              and the server reports that the content has not been modified since then, nothing is
+              written. Defaults to None.
+
+  Returns:
+      bool: True if the file was downloaded; False if if_modified_since was provided and the
+            content has not been modified since then.
   """
   if pool_manager is None:
-    pool_manager = urllib3.PoolManager()
+    pool_manager = get_default_pool_manager()
 
   if not filter_cmd is None and not isinstance(filter_cmd, list):
     filter_cmd = cast(List[str], [ filter_cmd ])
-  resp = pool_manager.request('GET', url, preload_content=False)
+  headers: Optional[Dict[str, str]] = None
+  if not if_modified_since is None:
+    headers = { 'If-Modified-Since': email.utils.formatdate(if_modified_since, usegmt=True) }
+  resp = pool_manager.request('GET', url, headers=headers, preload_content=False)
+  if resp.status == 304 and not if_modified_since is None:
+    resp.release_conn()
+    return False
   if filter_cmd is None or len(filter_cmd) == 0 or (len(filter_cmd) == 1 and filter_cmd[0] == 'cat'):
     if mode is None:
       with open(filename, 'wb') as f:
@@ -1279,22 +1778,25 @@ def download_url_file(
           ) as f:
         shutil.copyfileobj(resp, f)
   else:
-    with tempfile.NamedTemporaryFile(dir=get_tmp_dir()) as f3:
-      # NOTE: permissions on NamedTemporaryFile are 0o600 so we don't need to worry
-      #       about mode bits on the temp file
-      shutil.copyfileobj(resp, f3)
-      f3.flush()
-      # NOTE: following won't work on windows; see https://code.djangoproject.com/wiki/NamedTemporaryFile
-      with open(f3.name, 'rb') as f1:
-        if mode is None:
-          with open(filename, 'wb') as f2:
-            subprocess.check_call(filter_cmd, stdin=f1, stdout=f2)
-        else:
-          with open(
-                os.open(filename, os.O_CREAT | os.O_WRONLY, mode),
-                'wb',
-              ) as f2:
-            subprocess.check_call(filter_cmd, stdin=f1, stdout=f2)
+    # Pipe the response straight into the filter rather than staging it in a temporary file
+    if mode is None:
+      f2 = open(filename, 'wb')
+    else:
+      f2 = open(
+          os.open(filename, os.O_CREAT | os.O_WRONLY, mode),
+          'wb',
+        )
+    with f2:
+      with subprocess.Popen(filter_cmd, stdin=subprocess.PIPE, stdout=f2) as proc:
+        assert not proc.stdin is None
+        try:
+          shutil.copyfileobj(resp, proc.stdin)
+          proc.stdin.close()
+        except BrokenPipeError:
+          # The filter exited without reading all of its input; its exit code decides the outcome
+          pass
+      if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, filter_cmd)
   if not uid is None or not gid is None:
     if uid is None or gid is None:
       st = os.stat(filename)
@@ -1303,9 +1805,15 @@ def download_url_file(
       if gid is None:
         gid = st.st_gid
     os.chown(filename, uid, gid)
+  return True
 
 
+@run_once
 def running_as_root() -> bool:
+  """Returns True if the current process is running as root.
+
+  This package never changes the effective UID, so it is only checked once.
+  """
   return os.geteuid() == 0
 
 @run_once
@@ -1357,26 +1865,26 @@ def _sudo_fix_args(
   Returns:
       _CMD: The modified command suitable for subprocess.POpen, as a list of strings or a string.
   """
+  args_list: List[Any]
   if shell:
     if isinstance(args, list):
       raise RuntimeError(f"Arglist not allowed with shell=True: {args}")
-    args = cast(_CMD, [ 'bash', '-c', args ])
-
-  if not isinstance(args, list):
-    args = cast(_CMD, [ args ])
+    args_list = [ 'bash', '-c', args ]
+  elif isinstance(args, list):
+    args_list = args
+  else:
+    args_list = [ args ]
 
   need_group = not run_with_group is None and should_run_with_group(run_with_group)
-  is_root = running_as_root()
 
-  if need_group or (use_sudo and not is_root):
-    sudo_warn(args, stderr=stderr, sudo_reason=sudo_reason)
+  if not need_group and (not use_sudo or running_as_root()):
+    return args_list
+
+  sudo_warn(args_list, stderr=stderr, sudo_reason=sudo_reason)
 
-    new_args = [ 'sudo' ]
-    if need_group:
-      new_args.extend( [ '-E', '-u', get_current_os_user()  ] )
-    new_args.extend(cast(List[str], args))
-    args = new_args
-  return args
+  if need_group:
+    return [ 'sudo', '-E', '-u', get_current_os_user() ] + args_list
+  return [ 'sudo' ] + args_list
 
 def sudo_Popen(
       args: _CMD,
@@ -1822,7 +2330,7 @@ def sudo_check_output_stderr_exception(
   if exit_code != 0:
     if encoding is None:
       encoding = 'utf-8'
-    stderr_s = stderr_bytes if isinstance(stderr_bytes, str) else stderr_bytes.decode(encoding)
+    stderr_s = stderr_bytes if isinstance(stderr_bytes, str) else stderr_bytes.decode(encoding, errors='replace')
     stderr_s = stderr_s.rstrip()
     raise CalledProcessErrorWithStderrMessage(exit_code, args, stderr=stderr_s, output=stdout_bytes)
   return stdout_bytes
@@ -1917,7 +2425,7 @@ def sudo_check_call_stderr_exception(
   if exit_code != 0:
     if encoding is None:
       encoding = 'utf-8'
-    stderr_s = stderr_bytes if isinstance(stderr_bytes, str) else stderr_bytes.decode(encoding)
+    stderr_s = stderr_bytes if isinstance(stderr_bytes, str) else stderr_bytes.decode(encoding, errors='replace')
     stderr_s = stderr_s.rstrip()
     raise CalledProcessErrorWithStderrMessage(exit_code, args, stderr = stderr_s)
   return exit_code
@@ -1928,6 +2436,14 @@ def chown_root(filename: str, sudo_reason: Optional[str]=None):
 @run_once
 def get_linux_distro_name() -> str:
   """Returns the current Linux distribution name, e.g. 'jammy'."""
+  # Read the codename from os-release where possible, rather than running lsb_release
+  try:
+    os_release = platform.freedesktop_os_release()
+  except OSError:
+    os_release = {}
+  codename = os_release.get('VERSION_CODENAME') or os_release.get('UBUNTU_CODENAME')
+  if codename:
+    return codename
   result = subprocess.check_output(['lsb_release', '-cs'])
   linux_distro = result.decode('utf-8').rstrip()
   return linux_distro
@@ -1940,7 +2456,42 @@ def file_contents(filename: str) -> str:
 
 def pathname_is_executable(pathname: str) -> bool:
   """Returns True if pathname is an existing file that is executable by the current user."""
-  return os.path.isfile(pathname) and os.access(pathname, os.X_OK)
+  try:
+    st = os.stat(pathname)
+  except (OSError, ValueError):
+    return False
+  # A file with no execute bits is not executable by anyone, including root, so
+  # os.access() is only needed (for ACLs and ownership) when some bit is set
+  return stat.S_ISREG(st.st_mode) and (st.st_mode & 0o111) != 0 and os.access(pathname, os.X_OK)
+
+@lru_cache(maxsize=32)
+def _resolve_searchpath_dirs(searchpath: str, cwd: str, home: Optional[str]) -> Tuple[str, ...]:
+  """Cached list of absolute directories in a search path, resolved against cwd.
+
+  home is the value of $HOME, which only serves to key the cache, since a
+  leading '~' in a directory name is expanded from it.
+  """
+  return tuple(
+      os.path.abspath(os.path.join(cwd, _expanduser(path_dir)))
+        for path_dir in searchpath_split(searchpath)
+    )
+
+def _command_path_candidates(cmd: str, searchpath: Optional[str], cwd: Optional[str]) -> List[str]:
+  """Returns the absolute pathnames at which the shell would look for cmd, in search order."""
+  if cwd is None:
+    cwd = '.'
+  cwd = abspath_expanduser(cwd)
+  cmd = _expanduser(cmd)
+  if os.path.sep in cmd or (not os.path.altsep is None and os.path.altsep in cmd):
+    return [ os.path.abspath(os.path.join(cwd, cmd)) ]
+  if searchpath is None:
+    searchpath = os.environ['PATH']
+  path_dirs = _resolve_searchpath_dirs(searchpath, cwd, os.environ.get('HOME'))
+  # The directories are already normalized and cmd has no separators, so
+  # only '', '.' and '..' need normpath()
+  if cmd in ('', os.curdir, os.pardir):
+    return [ os.path.normpath(os.path.join(path_dir, cmd)) for path_dir in path_dirs ]
+  return [ os.path.join(path_dir, cmd) for path_dir in path_dirs ]
 
 def find_commands_in_path(
       cmd: str,
@@ -1978,17 +2529,7 @@ def find_commands_in_path(
   Yields:
       str: An absolute path to a matching executable
   """
-  if cwd is None:
-    cwd = '.'
-  cwd = os.path.abspath(os.path.expanduser(cwd))
-  cmd = os.path.expanduser(cmd)
-  if os.path.sep in cmd or (not os.path.altsep is None and os.path.altsep in cmd):
-    fq_cmd = os.path.abspath(os.path.join(cwd, cmd))
-    if pathname_is_executable(fq_cmd):
-      yield fq_cmd
-    return
-  for path_dir in searchpath_split(searchpath):
-    fq_cmd = os.path.abspath(os.path.join(cwd, os.path.expanduser(path_dir), cmd))
+  for fq_cmd in _command_path_candidates(cmd, searchpath, cwd):
     if pathname_is_executable(fq_cmd):
       yield fq_cmd
 
@@ -2014,11 +2555,19 @@ def pathname_is_in_dir(pathname: str, dirname: str) -> bool:
   Returns:
       bool: True if pathname is equal to dirname, or is under dirname.
   """
-  pathname = os.path.abspath(os.path.expanduser(pathname))
-  dirname = os.path.abspath(os.path.expanduser(dirname))
-  rp = os.path.relpath(pathname, dirname)
-  first_part = os.path.normpath(rp).split(os.sep)[0]
-  return first_part != '..'
+  pathname = abspath_expanduser(pathname)
+  dirname = abspath_expanduser(dirname)
+  # Both are normalized, so a prefix check is equivalent to os.path.relpath() not starting
+  # with '..'. POSIX normpath() preserves a leading '//', which relpath() treats as '/'.
+  if pathname.startswith('//'):
+    pathname = pathname[1:]
+  if dirname.startswith('//'):
+    dirname = dirname[1:]
+  if pathname == dirname:
+    return True
+  if not dirname.endswith(os.sep):
+    dirname += os.sep
+  return pathname.startswith(dirname)
 
 def pathname_is_in_venv(pathname: str) -> bool:
   """Returns True if a pathname refers to the current virtualenv or anything it.
@@ -2105,8 +2654,9 @@ def find_command_in_path(cmd: str, searchpath: Optional[str]=None, cwd: Optional
   Returns:
       str: An absolute path to a matching executable
   """
-  for fq_cmd in find_commands_in_path(cmd, searchpath=searchpath, cwd=cwd):
-    return fq_cmd
+  for fq_cmd in _command_path_candidates(cmd, searchpath, cwd):
+    if pathname_is_executable(fq_cmd):
+      return fq_cmd
   return None
 
 def find_command_in_path_outside_venv(cmd: str, searchpath: Optional[str]=None, cwd: Optional[str]=None) -> Optional[str]:
@@ -2161,7 +2711,7 @@ def command_exists(cmd: str, searchpath: Optional[str]=None, cwd: Optional[str]=
  """
   return not find_command_in_path(cmd, searchpath=searchpath, cwd=cwd) is None
 
-def command_exists_outside_venv(cmd: str) -> bool:
+def command_exists_outside_venv(cmd: str, searchpath: Optional[str]=None, cwd: Optional[str]=None) -> bool:
   """Returns True if the command exists in the search path, excluding the current virtualenv.
 
   If not currently running in a virtualenv, this function is identical to command_exists.
@@ -2179,38 +2729,54 @@ def command_exists_outside_venv(cmd: str) -> bool:
   Returns:
       bool: True if the command exists in the search path, excluding the current virtualenv.
  """
-  return not find_command_in_path_outside_venv(cmd) is None
+  return not find_command_in_path_outside_venv(cmd, searchpath=searchpath, cwd=cwd) is None
 
+@run_once
 def get_current_os_user() -> str:
-  """Get the current OS user name."""
+  """Get the current OS user name.
+
+  The login name does not change for the life of the process, so it is only
+  looked up once.
+  """
   return os.getlogin()
 
 def get_all_os_groups() -> List[str]:
   """Get a list of all OS group names."""
-  return sorted(x.gr_name for x in grp.getgrall())
+  return sorted(x.gr_name for x in _get_all_group_info())
 
 def os_group_exists(group_name: str) -> bool:
   """Returns True if the named OS group exists."""
-  gid: Optional[int] = None
+  return not _get_group_info_by_name(group_name) is None
+
+@lru_cache(maxsize=8)
+def _get_os_groups_of_user(user: str) -> Tuple[str, ...]:
+  """Cached, sorted OS group names of a user, including the user's primary group"""
   try:
-    groupinfo = grp.getgrnam(group_name)
-    gid = groupinfo.gr_gid
+    primary_gid = pwd.getpwnam(user).pw_gid
   except KeyError:
-    pass
-  return not gid is None
+    # Not in the password database; only explicit group memberships can be found
+    return tuple(sorted(group.gr_name for group in _get_all_group_info() if user in group.gr_mem))
+  names: Set[str] = set()
+  for gid in os.getgrouplist(user, primary_gid):
+    gi = _get_group_info_by_gid(gid)
+    if not gi is None:
+      names.add(gi.gr_name)
+  return tuple(sorted(names))
+
+@lru_cache(maxsize=8)
+def _get_os_group_set_of_user(user: str) -> FrozenSet[str]:
+  """Cached set of OS group names of a user, for membership tests"""
+  return frozenset(_get_os_groups_of_user(user))
 
 def get_os_groups_of_user(user: Optional[str]=None) -> List[str]:
   """Returns a list of OS group names for which the user is a member.
 
-  If user is None, the current user is used.
+  Includes the user's primary group as well as the groups that list the user as
+  a member. If user is None, the current user is used.
   """
   if user is None:
     user = get_current_os_user()
-  result: List[str] = []
-  for group in grp.getgrall():
-    if user in group.gr_mem:
-      result.append(group.gr_name)
-  return sorted(result)
+  return list(_get_os_groups_of_user(user))
 
 def get_os_groups_of_current_process() -> List[str]:
   """Returns a list of OS group names for which the current process is a member.
@@ -2219,20 +2785,25 @@ def get_os_groups_of_current_process() -> List[str]:
   added to the group after the current login session started, the current process
   will not be included in the group, and this function will reflect that.
   """
-  gids = os.getgroups()
-  result: List[str] = []
-  for group in grp.getgrall():
-    if group.gr_gid in gids:
-      result.append(group.gr_name)
-  return sorted(result)
+  gids = set(os.getgroups())
+  # The effective group may not be repeated in the supplementary group list
+  gids.add(os.getegid())
+  # Look up just the process's groups rather than enumerating the whole group database
+  names: Set[str] = set()
+  for gid in gids:
+    gi = _get_group_info_by_gid(gid)
+    if not gi is None:
+      names.add(gi.gr_name)
+  return sorted(names)
 
 def os_group_includes_user(group_name: str, user: Optional[str]=None) -> bool:
   """Returns True if the named OS group includes the named user.
 
   If user is None, the current user is used.
   """
-  groups = get_os_groups_of_user(user=user)
-  return group_name in groups
+  if user is None:
+    user = get_current_os_user()
+  return group_name in _get_os_group_set_of_user(user)
 
 def os_group_includes_current_process(group_name: str) -> bool:
   """Returns True if the named OS group includes the current process.
@@ -2241,8 +2812,10 @@ def os_group_includes_current_process(group_name: str) -> bool:
   added to the group after the current login session started, the current process
   will not be included in the group, and this function will reflect that.
   """
-  groups = get_os_groups_of_current_process()
-  return group_name in groups
+  gi = _get_group_info_by_name(group_name)
+  if gi is None:
+    return False
+  return gi.gr_gid == os.getegid() or gi.gr_gid in os.getgroups()
 
 def should_run_with_group(group_name: str, require: bool=True) -> bool:
   """Returns True if the current user is a member of the named OS group,
@@ -2289,8 +2862,8 @@ def unix_mv(source: str, dest: str, use_sudo: bool=False, sudo_reason: Optional[
   Raises:
       RuntimeError: Any error from the mv command
   """
-  source = os.path.expanduser(source)
-  dest = os.path.expanduser(dest)
+  source = _expanduser(source)
+  dest = _expanduser(dest)
   sudo_check_output_stderr_exception(['mv', source, dest], use_sudo=use_sudo, sudo_reason=sudo_reason)
 
 if TYPE_CHECKING:
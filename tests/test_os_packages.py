@@ -0,0 +1,86 @@
+#
+# Copyright (c) 2022 Samuel J. McKelvie
+#
+# MIT License - See LICENSE file accompanying this package.
+#
+
+"""Tests for skipping 'apt-get update' when the package lists are fresh"""
+
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from project_init_tools import os_packages
+
+
+class TestUpdateAndUpgradeOsPackages(unittest.TestCase):
+  def setUp(self) -> None:
+    tmp = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+    self.addCleanup(tmp.cleanup)
+    lists_dir = os.path.join(tmp.name, 'lists')
+    os.mkdir(lists_dir)
+    with open(os.path.join(lists_dir, 'deb.example.com_dists_stable_InRelease'), 'w', encoding='utf-8'):
+      pass
+    self.sources_list = os.path.join(tmp.name, 'sources.list')
+    with open(self.sources_list, 'w', encoding='utf-8'):
+      pass
+    sources_dir = os.path.join(tmp.name, 'sources.list.d')
+    os.mkdir(sources_dir)
+    old = time.time() - 100
+    os.utime(self.sources_list, (old, old))
+    os.utime(sources_dir, (old, old))
+    stamp_file = os.path.join(tmp.name, 'apt-get-update.stamp')
+
+    self.sudo_check_call = mock.Mock()
+    for name, value in (
+          ('_apt_lists_dir', lists_dir),
+          ('_apt_sources_list', self.sources_list),
+          ('_apt_sources_dir', sources_dir),
+          ('_get_os_package_list_stamp_file', lambda: stamp_file),
+          ('sudo_check_call', self.sudo_check_call),
+          ('get_installed_os_package_versions', lambda names: { x: '1.0' for x in names }),
+          ('_get_os_package_candidate_versions', lambda names: { x: '1.0' for x in names }),
+          ('_os_package_metadata_invalidated', False),
+        ):
+      patcher = mock.patch.object(os_packages, name, value)
+      patcher.start()
+      self.addCleanup(patcher.stop)
+    self._new_process()
+
+  def _new_process(self) -> None:
+    """Forgets this process's own record of having updated the package lists"""
+    patcher = mock.patch.object(os_packages, '_os_package_metadata_stale', True)
+    patcher.start()
+    self.addCleanup(patcher.stop)
+
+  def _update_count(self) -> int:
+    return sum(1 for c in self.sudo_check_call.call_args_list if c.args[0] == ['apt-get', 'update'])
+
+  def test_update_is_skipped_while_stamp_is_recent(self) -> None:
+    os_packages.update_and_upgrade_os_packages('example')
+    self.assertEqual(self._update_count(), 1)
+    self._new_process()
+    os_packages.update_and_upgrade_os_packages('example')
+    self.assertEqual(self._update_count(), 1)
+
+  def test_update_is_forced_after_sources_change(self) -> None:
+    os_packages.update_and_upgrade_os_packages('example')
+    self.assertEqual(self._update_count(), 1)
+    newer = time.time() + 10
+    os.utime(self.sources_list, (newer, newer))
+    self._new_process()
+    os_packages.update_and_upgrade_os_packages('example')
+    self.assertEqual(self._update_count(), 2)
+
+  def test_update_runs_when_stamp_is_old(self) -> None:
+    os_packages.update_and_upgrade_os_packages('example')
+    with mock.patch.object(os_packages, 'os_package_list_max_age', 0.0):
+      self._new_process()
+      os_packages.update_and_upgrade_os_packages('example')
+    self.assertEqual(self._update_count(), 2)
+
+
+if __name__ == '__main__':
+  unittest.main()